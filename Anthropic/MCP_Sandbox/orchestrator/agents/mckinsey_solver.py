@@ -1,14 +1,24 @@
 # orchestrator/agents/mckinsey_solver.py
-from pydantic import BaseModel, Field
-from typing import List, Optional
+import msgspec
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, List, Optional, Tuple
+
+# The plan contract: read-only once parsed, and no fields beyond the schema (the JSON
+# schema says additionalProperties: false). The msgspec Structs below decode LLM output
+# and enforce the same contract (frozen=True, forbid_unknown_fields=True).
+_PLAN_MODEL_CONFIG = ConfigDict(frozen=True, extra='forbid')
 
 class AnalysisStep(BaseModel):
+    model_config = _PLAN_MODEL_CONFIG
+
     step_name: str = Field(description="Clear name for the analysis step (e.g., 'Market Size Estimation', 'Competitor Benchmarking').")
     description: str = Field(description="What specific question this analysis answers or what data it aims to gather.")
     data_sources: List[str] = Field(description="Potential sources of data required (e.g., 'Internal sales data', 'Industry reports', 'Customer surveys').")
     responsible: Optional[str] = Field(default=None, description="Team or role potentially responsible (e.g., 'Marketing Team', 'Data Science').")
 
 class Recommendation(BaseModel):
+    model_config = _PLAN_MODEL_CONFIG
+
     recommendation_title: str = Field(description="Concise title for the recommendation.")
     description: str = Field(description="Detailed explanation of the proposed action or strategy.")
     key_supporting_findings: List[str] = Field(description="List of key synthesized findings that support this recommendation.")
@@ -28,11 +38,56 @@ class McKinseySolutionPlan(BaseModel):
     recommendations: List[Recommendation] = Field(description="Actionable recommendations based on the synthesized findings.")
     communication_summary: Optional[str] = Field(default=None, description="A brief narrative or storyline (Situation-Complication-Resolution) summarizing the core message for stakeholders.")
 
-    model_config = {
-        "json_schema_extra": {
+    model_config = ConfigDict(
+        **_PLAN_MODEL_CONFIG,
+        json_schema_extra={
             "description": "Structured output for a McKinsey 7-Step Problem Solving approach."
-        }
-    }
+        },
+    )
+
+
+# --- msgspec mirrors of the schema above ---
+# Used on the hot path to decode LLM responses: msgspec parses and validates in one
+# pass straight into Structs. The Pydantic models stay the documented schema and
+# remain available for existing callers; keep the two in sync when adding fields.
+# Like the models, the Structs are read-only and reject fields outside the schema.
+class AnalysisStepMsg(msgspec.Struct, frozen=True, forbid_unknown_fields=True):
+    step_name: str
+    description: str
+    data_sources: List[str]
+    responsible: Optional[str] = None
+
+class RecommendationMsg(msgspec.Struct, frozen=True, forbid_unknown_fields=True):
+    recommendation_title: str
+    description: str
+    key_supporting_findings: List[str]
+    potential_risks: Optional[List[str]] = None
+    next_steps: Optional[List[str]] = None
+
+class McKinseySolutionPlanMsg(msgspec.Struct, frozen=True, forbid_unknown_fields=True):
+    problem_definition: str
+    structured_issues: List[str]
+    prioritized_issues: List[str]
+    analysis_workplan: List[AnalysisStepMsg]
+    synthesized_findings: str
+    recommendations: List[RecommendationMsg]
+    communication_summary: Optional[str] = None
+
+# Decoders are built once; reuse them rather than calling msgspec.json.decode(type=...)
+PLAN_DECODER = msgspec.json.Decoder(McKinseySolutionPlanMsg)
+PLAN_BATCH_DECODER = msgspec.json.Decoder(List[McKinseySolutionPlanMsg])
+
+def try_parse_plan(data: bytes, decoder: msgspec.json.Decoder = PLAN_DECODER) -> Tuple[Any, Optional[str]]:
+    """
+    Decodes LLM output with the given decoder, returning (result, None) or (None, error message).
+
+    Malformed output is routine for LLMs, so it is reported as data; callers branch
+    on the tuple instead of unwinding an exception for every bad response.
+    """
+    try:
+        return decoder.decode(data), None
+    except msgspec.DecodeError as e: # Also covers msgspec.ValidationError
+        return None, str(e)
 
 # System prompt can also be stored here as a constant string
 MCKINSEY_SYSTEM_PROMPT = """
@@ -1,12 +1,15 @@
 import asyncio
-import json
+import datetime
+import functools
 import logging
 import os
 import subprocess
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import google.generativeai as genai
+import msgspec
+from aioconsole import ainput
 from dotenv import load_dotenv
 
 # MCP Client Imports (assuming mcp package is installed)
@@ -16,7 +19,7 @@ import mcp.types as mcp_types
 
 # Local Imports (adjust paths if structure differs)
 from prompt_generators.loader import load_prompt_generators, SimplePromptGeneratorFunc
-from agents.mckinsey_solver import McKinseySolutionPlan, MCKINSEY_SYSTEM_PROMPT
+from agents.mckinsey_solver import McKinseySolutionPlanMsg, PLAN_BATCH_DECODER, MCKINSEY_SYSTEM_PROMPT, try_parse_plan
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -34,174 +37,345 @@ if not GEMINI_API_KEY:
 MCP_SERVER_PROJECT_DIR = "./starship-bridge-mcp-agent" # Relative path to the server project
 MCP_SERVER_COMMAND = "uv"
 MCP_SERVER_ARGS = ["run", "python", "mcp_server/main.py"]
+# Environment handed to the MCP server, captured once (after load_dotenv) rather than per session
+_MCP_ENV = dict(os.environ)
+# Timeout (seconds) for the MCP initialize handshake; replaces a fixed startup sleep.
+# Over stdio the request simply waits in the server's pipe until it is ready, so it is
+# sent once (MCP_INIT_TIMEOUT env var; unset waits for the server indefinitely).
+MCP_INIT_TIMEOUT = float(os.environ["MCP_INIT_TIMEOUT"]) if os.getenv("MCP_INIT_TIMEOUT") else None
+
+# Problems typed/pasted in quick succession are solved with one Gemini request:
+# a batch closes after MCKINSEY_BATCH_WINDOW seconds of inactivity or MCKINSEY_BATCH_MAX problems.
+MCKINSEY_BATCH_WINDOW = 0.2
+MCKINSEY_BATCH_MAX = 8
+MCKINSEY_BATCH_SEPARATOR = "\n\n===== PROBLEM BOUNDARY =====\n\n"
 
 # Configure Gemini client
 genai.configure(api_key=GEMINI_API_KEY)
 # Using a model that supports longer context and JSON mode potentially
 # Update model name as needed (e.g., 'gemini-1.5-pro-latest')
-gemini_model_name = 'gemini-1.5-flash' # Or 'gemini-1.5-pro'
-gemini_model = genai.GenerativeModel(gemini_model_name)
+# Context caching needs an explicitly versioned model, not the 'gemini-1.5-flash' alias
+gemini_model_name = 'gemini-1.5-flash-002' # Or 'gemini-1.5-pro-002'
+# Lifetime of the cached McKinsey system prompt; refreshed in the background while running
+MCKINSEY_PROMPT_CACHE_TTL = datetime.timedelta(hours=1)
+# Gemini 1.5 only caches prompts of at least this many tokens; smaller system prompts
+# skip the CachedContent.create round-trip, which would just be rejected
+CONTEXT_CACHE_MIN_TOKENS = 32_768
+CHARS_PER_TOKEN = 4 # Rough estimate for English text; avoids a count_tokens request
+
+
+@functools.cache
+def _get_mckinsey_model() -> tuple[genai.GenerativeModel, Any]:
+    """
+    Binds MCKINSEY_SYSTEM_PROMPT to the model on first use (not at import, which would
+    make a network call), so requests only send the problem input.
+
+    Prefers Gemini context caching (the static prefix is billed/tokenized once per TTL)
+    when the prompt reaches the minimum cacheable size; otherwise, or if the cache
+    cannot be created, the prompt is bound as a plain system_instruction.
+    """
+    if len(MCKINSEY_SYSTEM_PROMPT) < CONTEXT_CACHE_MIN_TOKENS * CHARS_PER_TOKEN:
+        return genai.GenerativeModel(gemini_model_name, system_instruction=MCKINSEY_SYSTEM_PROMPT), None
+    try:
+        cached = genai.caching.CachedContent.create(
+            model=gemini_model_name,
+            system_instruction=MCKINSEY_SYSTEM_PROMPT,
+            ttl=MCKINSEY_PROMPT_CACHE_TTL,
+        )
+        logger.info(f"Cached McKinsey system prompt as {cached.name}")
+        return genai.GenerativeModel.from_cached_content(cached_content=cached), cached
+    except Exception as e:
+        logger.warning(f"Context caching unavailable ({e}); using system_instruction instead.")
+        return genai.GenerativeModel(gemini_model_name, system_instruction=MCKINSEY_SYSTEM_PROMPT), None
+
+
+async def _keep_prompt_cache_alive(cached: Any) -> None:
+    """Extends the cached system prompt's TTL before it expires."""
+    refresh_interval = MCKINSEY_PROMPT_CACHE_TTL.total_seconds() / 2
+    while True:
+        await asyncio.sleep(refresh_interval)
+        try:
+            await asyncio.to_thread(cached.update, ttl=MCKINSEY_PROMPT_CACHE_TTL)
+            logger.info("Refreshed McKinsey system prompt cache TTL.")
+        except Exception as e:
+            logger.warning(f"Failed to refresh McKinsey system prompt cache: {e}")
+
+
 logger.info(f"Using Gemini Model: {gemini_model_name}")
+# Shared by every McKinsey request; GenerationConfig is a dataclass, so use
+# dataclasses.replace(_GEN_CONFIG, ...) for per-request overrides.
+# Note: Adjust for JSON if using Pro model and it's reliable
+_GEN_CONFIG = genai.types.GenerationConfig(
+     # response_mime_type="application/json" # Uncomment if using Pro and JSON mode is reliable
+     temperature=0.5 # Adjust as needed
+)
 
 # --- Load Prompt Generators ---
 # Assumes generators are in orchestrator/prompt_generators/
 prompt_generator_functions: Dict[str, SimplePromptGeneratorFunc] = load_prompt_generators()
 if not prompt_generator_functions:
      logger.warning("No prompt generators loaded. The McKinsey agent might not receive diverse input.")
+# Section headings are fixed per generator, so format them once here
+_SECTION_HEADINGS: Dict[str, str] = {
+     name: f"--- Analysis from {name.replace('_', ' ').title()} Perspective ---\n"
+     for name in prompt_generator_functions
+}
+
+def _extract_json_object(response_text: str, open_char: str = '{', close_char: str = '}') -> str:
+    """Slices the outermost {...} (or [...]) out of an LLM response, dropping any Markdown fences."""
+    start = response_text.find(open_char)
+    end = response_text.rfind(close_char)
+    if start == -1 or end < start:
+        return response_text.strip()
+    return response_text[start:end + 1]
+
+
+@functools.lru_cache(maxsize=64)
+def build_mckinsey_input(problem: str, generated_prompts: Tuple[Tuple[str, str | None], ...]) -> str:
+    """Joins per-generator prompts into the McKinsey input; cached so repeat problems reuse it."""
+    # One flat fragment list and a single join: no per-section intermediate strings
+    fragments = [f"Comprehensive analysis input for problem '{problem}':\n\n"]
+    for name, prompt_str in generated_prompts:
+         fragments += (_SECTION_HEADINGS[name], prompt_str or 'Error during generation.', "\n\n")
+    if generated_prompts:
+         fragments[-1] = "\n" # No blank-line separator after the last section
+    return "".join(fragments)
+
+
+def _synthesize_mckinsey_input(captain_problem: str) -> str | None:
+    """Runs every prompt generator on the problem and merges the results into one input block."""
+    logger.info(f"Received problem: {captain_problem}")
+    print("Orchestrator: Generating multi-perspective analysis prompts...")
+
+    # --- Prompt Generation ---
+    # Generators are pure string formatting, so call them inline; wrapping
+    # them in tasks only added scheduling overhead without any parallelism.
+    # Switch to asyncio.gather(asyncio.to_thread(...)) if they become I/O-bound.
+    generated_prompts: List[Tuple[str, str | None]] = [
+        (name, _safe_call(name, func, captain_problem))
+        for name, func in prompt_generator_functions.items()
+    ]
+
+    # --- Synthesize Input for McKinsey Agent ---
+    successful_generators = sum(1 for _, prompt_str in generated_prompts if prompt_str)
+
+    if successful_generators == 0:
+         print("Orchestrator: ERROR - Failed to generate input from any perspective.")
+         return None
+
+    full_mckinsey_input = build_mckinsey_input(captain_problem, tuple(generated_prompts))
+    logger.info(f"Synthesized input for McKinsey Agent (length: {len(full_mckinsey_input)} chars)")
+    # logger.debug(f"Full Input:\n{full_mckinsey_input}") # Optional: log full input if needed
+
+    print(f"Orchestrator: Synthesized input from {successful_generators} perspectives.")
+    return full_mckinsey_input
+
+
+async def _invoke_mckinsey(contents: str) -> str:
+    """Sends one request to the McKinsey Solver Agent and returns the raw response text."""
+    # Use Gemini API - potentially request JSON output if model supports it well (see _GEN_CONFIG)
+    gemini_model, _ = _get_mckinsey_model()
+    mckinsey_response = await gemini_model.generate_content_async(
+         [contents], # System prompt is bound to gemini_model
+         generation_config=_GEN_CONFIG,
+    )
+    logger.info("Received response from McKinsey Solver Agent.")
+    # logger.debug(f"McKinsey Agent Raw Response:\n{mckinsey_response.text}") # Optional
+    return mckinsey_response.text
+
+
+def _print_plan(mckinsey_plan: McKinseySolutionPlanMsg) -> None:
+    print("\n--- McKinsey Solution Plan ---")
+    print(msgspec.json.format(msgspec.json.encode(mckinsey_plan), indent=2).decode())
+    print("-----------------------------")
+    print("\nOrchestrator: Plan generated. Ready for next command or execution approval.")
+    # TODO: Add logic here to ask Captain for approval and then
+    # use mcp_session.call_tool to execute steps from the plan
+
+
+async def _solve_single(full_mckinsey_input: str) -> None:
+    """Generates, validates and prints the plan for a single synthesized problem input."""
+    print("Orchestrator: Invoking McKinsey Solver Agent...")
+    try:
+         response_text = await _invoke_mckinsey(full_mckinsey_input)
+    except Exception as e:
+         logger.error(f"Error during McKinsey Agent interaction: {e}", exc_info=True)
+         print(f"Orchestrator: ERROR - An error occurred while generating the plan: {e}")
+         return
+
+    # --- Parse and Validate Output ---
+    # Attempt to parse JSON (may need cleanup if not using strict JSON mode)
+    cleaned_json_text = _extract_json_object(response_text)
+    mckinsey_plan, parse_error = try_parse_plan(cleaned_json_text.encode('utf-8'))
+    if parse_error:
+         logger.error(f"Failed to decode JSON from McKinsey Agent: {parse_error}")
+         print(f"Orchestrator: ERROR - Could not parse the plan from the McKinsey Agent. Raw response:\n{response_text}")
+         return
+    _print_plan(mckinsey_plan)
+
+
+async def _solve_batch(mckinsey_inputs: List[str]) -> bool:
+    """
+    Solves several synthesized problem inputs with a single Gemini request.
+
+    Returns False (without printing any plan) if the batched response is unusable, so the
+    caller can fall back to one request per problem.
+    """
+    print(f"Orchestrator: Invoking McKinsey Solver Agent on a batch of {len(mckinsey_inputs)} problems...")
+    batch_prompt = (
+        f"You will receive {len(mckinsey_inputs)} independent problem analyses, separated by the line "
+        f"'{MCKINSEY_BATCH_SEPARATOR.strip()}'. Produce one McKinseySolutionPlan per analysis and respond "
+        "**ONLY** with a JSON array of those objects, in the same order as the analyses."
+        + MCKINSEY_BATCH_SEPARATOR
+        + MCKINSEY_BATCH_SEPARATOR.join(mckinsey_inputs)
+    )
+    try:
+        response_text = await _invoke_mckinsey(batch_prompt)
+    except Exception as e:
+        logger.warning(f"Batched McKinsey request failed ({e}); falling back to one request per problem.")
+        return False
+
+    cleaned_json_text = _extract_json_object(response_text, '[', ']')
+    plans, parse_error = try_parse_plan(cleaned_json_text.encode('utf-8'), PLAN_BATCH_DECODER)
+    if parse_error is None and len(plans) != len(mckinsey_inputs):
+        parse_error = f"expected {len(mckinsey_inputs)} plans, got {len(plans)}"
+    if parse_error:
+        logger.warning(f"Could not use batched McKinsey response ({parse_error}); falling back to one request per problem.")
+        return False
+
+    for mckinsey_plan in plans:
+        _print_plan(mckinsey_plan)
+    return True
+
+
+async def _handle_mcp_message(message: Any) -> None:
+    """Surfaces MCP server pushes (progress, logs, resource updates) as they arrive, even mid-prompt."""
+    if isinstance(message, Exception):
+        logger.warning(f"MCP transport error: {message}")
+    else:
+        logger.info(f"MCP server message: {message}")
+
+
+async def _read_captain_problems(problem_queue: "asyncio.Queue[str]") -> None:
+    """Feeds typed (or pasted) problems into the queue without blocking the event loop."""
+    while True:
+        try:
+            captain_problem = await ainput("\nCaptain Problem: ")
+        except EOFError:
+            captain_problem = "exit"
+        await problem_queue.put(captain_problem)
+        if captain_problem.lower() in ["quit", "exit"]:
+            return
+
+
+async def _next_problem_batch(problem_queue: "asyncio.Queue[str]") -> Tuple[List[str], bool]:
+    """
+    Waits for the next problem, then keeps collecting until the input goes quiet
+    or the batch is full. Returns the batch and whether the Captain asked to quit.
+    """
+    batch = [await problem_queue.get()]
+    while len(batch) < MCKINSEY_BATCH_MAX:
+        try:
+            batch.append(await asyncio.wait_for(problem_queue.get(), timeout=MCKINSEY_BATCH_WINDOW))
+        except asyncio.TimeoutError:
+            break
+    for i, captain_problem in enumerate(batch):
+        if captain_problem.lower() in ["quit", "exit"]:
+            return batch[:i], True
+    return batch, False
+
+
+async def _initialize_session(mcp_session: ClientSession) -> Tuple[Any, Exception | None]:
+    """
+    Waits for the server to answer initialize (no blind startup sleep).
+    Returns (initialize result, None) or (None, error).
+    """
+    try:
+        return await asyncio.wait_for(mcp_session.initialize(), timeout=MCP_INIT_TIMEOUT), None
+    except Exception as e: # asyncio.TimeoutError, or the server exiting during startup
+        return None, e
+
 
 # --- Main Orchestration Loop ---
 async def main():
     logger.info("Starting Orchestration Assistant Client...")
-    mcp_server_process = None # Initialize to None
+    _, mckinsey_prompt_cache = _get_mckinsey_model()
+    cache_refresh_task = asyncio.create_task(_keep_prompt_cache_alive(mckinsey_prompt_cache)) if mckinsey_prompt_cache else None
+    reader_task: asyncio.Task | None = None
 
     try:
-        # --- Start MCP Server ---
+        # --- Start MCP Server & Connect MCP Client ---
+        # stdio_client spawns the server itself, forwards its stderr and terminates it on exit
         logger.info(f"Starting MCP Server process: {MCP_SERVER_COMMAND} {' '.join(MCP_SERVER_ARGS)} in {MCP_SERVER_PROJECT_DIR}")
-        mcp_server_process = await asyncio.create_subprocess_exec(
-            MCP_SERVER_COMMAND, *MCP_SERVER_ARGS,
-            cwd=MCP_SERVER_PROJECT_DIR,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        logger.info(f"MCP Server process started (PID: {mcp_server_process.pid}). Waiting briefly...")
-        await asyncio.sleep(7) # Increased wait time
-
-        # --- Connect MCP Client ---
         server_params = StdioServerParameters(
             command=MCP_SERVER_COMMAND, args=MCP_SERVER_ARGS, cwd=MCP_SERVER_PROJECT_DIR,
-            env=os.environ.copy() # Pass current environment
+            env=_MCP_ENV # Pass current environment
         )
         async with stdio_client(server_params) as streams:
             read_stream, write_stream = streams
-            async with ClientSession(read_stream, write_stream) as mcp_session:
+            async with ClientSession(read_stream, write_stream, message_handler=_handle_mcp_message) as mcp_session:
                 logger.info("MCP Client connecting...")
-                try:
-                    init_result = await mcp_session.initialize()
-                    logger.info(f"MCP Client initialized with server: {init_result.serverInfo.name} v{init_result.serverInfo.version}")
-                except Exception as e:
-                    logger.error(f"MCP initialization failed: {e}")
-                    # Attempt to get server logs
-                    try:
-                         stdout, stderr = await asyncio.wait_for(mcp_server_process.communicate(), timeout=2.0)
-                         logger.error(f"MCP Server stdout:\n{stdout.decode(errors='ignore')}")
-                         logger.error(f"MCP Server stderr:\n{stderr.decode(errors='ignore')}")
-                    except asyncio.TimeoutError:
-                         logger.error("Timed out waiting for MCP server logs.")
-                    except Exception as log_err:
-                         logger.error(f"Error getting MCP server logs: {log_err}")
+                init_result, init_error = await _initialize_session(mcp_session)
+                if init_result is None:
+                    logger.error(f"MCP initialization failed: {init_error!r}")
+                    logger.error("Check the MCP Server output above (its stderr is forwarded by stdio_client).")
                     return # Exit if connection fails
+                logger.info(f"MCP Client initialized with server: {init_result.serverInfo.name} v{init_result.serverInfo.version}")
 
                 # --- Interaction Loop ---
                 print("\n--- Starship Bridge Orchestrator ---")
                 print("Enter the core problem/goal you want to analyze.")
 
-                while True:
-                    captain_problem = input("\nCaptain Problem: ")
-                    if captain_problem.lower() in ["quit", "exit"]:
-                        break
-
-                    logger.info(f"Received problem: {captain_problem}")
-                    print("Orchestrator: Generating multi-perspective analysis prompts...")
-
-                    # --- Parallel Prompt Generation ---
-                    tasks = []
-                    for name, func in prompt_generator_functions.items():
-                        # Create task to call the generator function
-                        # Use asyncio.to_thread if generators are synchronous and potentially blocking
-                        # Assuming simple string formatting is fast enough for direct await here
-                        tasks.append(asyncio.create_task(run_prompt_generator(name, func, captain_problem)))
+                problem_queue: "asyncio.Queue[str]" = asyncio.Queue()
+                reader_task = asyncio.create_task(_read_captain_problems(problem_queue))
 
-                    # Wait for all prompt generator tasks to complete
-                    generated_prompts: List[Tuple[str, str | None]] = await asyncio.gather(*tasks)
-
-                    # --- Synthesize Input for McKinsey Agent ---
-                    mckinsey_input_parts = []
-                    successful_generators = 0
-                    for name, prompt_str in generated_prompts:
-                         if prompt_str:
-                              mckinsey_input_parts.append(f"--- Analysis from {name.replace('_', ' ').title()} Perspective ---\n{prompt_str}\n")
-                              successful_generators += 1
-                         else:
-                              mckinsey_input_parts.append(f"--- Analysis from {name.replace('_', ' ').title()} Perspective ---\nError during generation.\n")
-
-                    if successful_generators == 0:
-                         print("Orchestrator: ERROR - Failed to generate input from any perspective.")
-                         continue
+                while True:
+                    captain_problems, quit_requested = await _next_problem_batch(problem_queue)
+                    mckinsey_inputs = [i for i in map(_synthesize_mckinsey_input, captain_problems) if i]
 
-                    full_mckinsey_input = f"Comprehensive analysis input for problem '{captain_problem}':\n\n" + "\n".join(mckinsey_input_parts)
-                    logger.info(f"Synthesized input for McKinsey Agent (length: {len(full_mckinsey_input)} chars)")
-                    # logger.debug(f"Full Input:\n{full_mckinsey_input}") # Optional: log full input if needed
+                    # --- Invoke McKinsey Solver Agent ---
+                    if len(mckinsey_inputs) > 1 and await _solve_batch(mckinsey_inputs):
+                        mckinsey_inputs = []
+                    for full_mckinsey_input in mckinsey_inputs:
+                        await _solve_single(full_mckinsey_input)
 
-                    print(f"Orchestrator: Synthesized input from {successful_generators} perspectives. Invoking McKinsey Solver Agent...")
+                    if quit_requested:
+                        break
 
-                    # --- Invoke McKinsey Solver Agent ---
-                    try:
-                         # Use Gemini API - potentially request JSON output if model supports it well
-                         # Note: Adjust generation_config for JSON if using Pro model and it's reliable
-                         generation_config = genai.types.GenerationConfig(
-                              # response_mime_type="application/json" # Uncomment if using Pro and JSON mode is reliable
-                              temperature=0.5 # Adjust as needed
-                         )
-                         mckinsey_response = await gemini_model.generate_content_async(
-                              [MCKINSEY_SYSTEM_PROMPT, full_mckinsey_input],
-                              generation_config=generation_config,
-                         )
-
-                         response_text = mckinsey_response.text
-                         logger.info("Received response from McKinsey Solver Agent.")
-                         # logger.debug(f"McKinsey Agent Raw Response:\n{response_text}") # Optional
-
-                         # --- Parse and Validate Output ---
-                         # Attempt to parse JSON (may need cleanup if not using strict JSON mode)
-                         cleaned_json_text = response_text.strip().replace('```json', '').replace('```', '')
-                         plan_data = json.loads(cleaned_json_text)
-                         mckinsey_plan = McKinseySolutionPlan.model_validate(plan_data)
-
-                         print("\n--- McKinsey Solution Plan ---")
-                         print(mckinsey_plan.model_dump_json(indent=2))
-                         print("-----------------------------")
-                         print("\nOrchestrator: Plan generated. Ready for next command or execution approval.")
-                         # TODO: Add logic here to ask Captain for approval and then
-                         # use mcp_session.call_tool to execute steps from the plan
-
-                    except json.JSONDecodeError as e:
-                         logger.error(f"Failed to decode JSON from McKinsey Agent: {e}")
-                         print(f"Orchestrator: ERROR - Could not parse the plan from the McKinsey Agent. Raw response:\n{response_text}")
-                    except Exception as e:
-                         logger.error(f"Error during McKinsey Agent interaction: {e}", exc_info=True)
-                         print(f"Orchestrator: ERROR - An error occurred while generating the plan: {e}")
+                await reader_task
 
 
     except Exception as e:
          logger.exception(f"Orchestrator client encountered an unhandled error: {e}")
     finally:
         # --- Shutdown ---
-        if mcp_server_process and mcp_server_process.returncode is None:
-            logger.info("Terminating MCP Server process...")
-            try:
-                mcp_server_process.terminate()
-                await asyncio.wait_for(mcp_server_process.wait(), timeout=5.0)
-                logger.info("MCP Server process terminated.")
-            except asyncio.TimeoutError:
-                logger.warning("MCP Server process did not terminate gracefully, killing.")
-                mcp_server_process.kill()
-            except ProcessLookupError:
-                 logger.info("MCP Server process already terminated.")
+        if cache_refresh_task:
+            cache_refresh_task.cancel()
+        if reader_task:
+            # Still waiting on input if we got here through an error (or Ctrl+C)
+            reader_task.cancel()
+            await asyncio.gather(reader_task, return_exceptions=True)
+        # The MCP server process is shut down by stdio_client on context exit
         logger.info("Orchestration Assistant Client shutting down.")
 
 
-async def run_prompt_generator(name: str, func: SimplePromptGeneratorFunc, problem: str) -> Tuple[str, str | None]:
+def _safe_call(name: str, func: SimplePromptGeneratorFunc, problem: str) -> str | None:
     """Runs a single generator function, handling errors."""
     try:
-        # Assuming generator funcs are synchronous - wrap if they become async
-        prompt = func(problem)
-        return name, prompt
+        return func(problem)
     except Exception as e:
         logger.error(f"Error running prompt generator '{name}': {e}")
-        return name, None # Return None on error
+        return None # Return None on error
 
 
 if __name__ == "__main__":
+    # uvloop speeds up the subprocess pipe / stdio traffic with the MCP server;
+    # fall back to the stdlib loop where it is unavailable (e.g. Windows).
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,14 @@
+# orchestrator/prompt_generators/_text.py
+# String helpers shared by the prompt generators. The leading underscore keeps
+# load_prompt_generators() from treating this module as a generator.
+
+def cap_first(text: str) -> str:
+  """
+  Uppercases the first character of text.
+
+  Input that is empty or already capitalized (the common case for typed
+  Captain sentences) is returned as-is, skipping the slice/concat allocations.
+  """
+  if text and not text[0].isupper():
+    return text[:1].upper() + text[1:]
+  return text
@@ -1,3 +1,6 @@
+_DEFAULT_ADAPTATION = "Describe how its core principles or underlying logic could be adapted to this new context."
+_SPECIFICS_REQUEST = "Outline the key components or steps of this analogous approach."
+
 def analogous_reasoning(source_domain_concept: str, target_problem_domain: str, adaptation_goal: str = None) -> str:
   """
   Transforms a source concept and target problem into a prompt for 
@@ -35,12 +38,10 @@ def analogous_reasoning(source_domain_concept: str, target_problem_domain: str,
     goal_clean = adaptation_goal.strip()
     adaptation_instruction = f"Adapt its core concepts or logic specifically for {goal_clean}."
   else:
-    adaptation_instruction = "Describe how its core principles or underlying logic could be adapted to this new context."
+    adaptation_instruction = _DEFAULT_ADAPTATION
     
-  # 4. Add a request for specifics (to encourage concrete output)
-  specifics_request = "Outline the key components or steps of this analogous approach."
-
-  # 5. Assemble the final prompt
-  output_prompt = f"{core_question} {adaptation_instruction} {specifics_request}"
+  # 4. Assemble the final prompt, closing with a request for specifics
+  #    (to encourage concrete output)
+  output_prompt = " ".join((core_question, adaptation_instruction, _SPECIFICS_REQUEST))
   
   return output_prompt
@@ -1,5 +1,13 @@
 import re
 
+from ._text import cap_first
+
+# Simple regex to remove common leading phrases (can be expanded)
+_LEAD_RE = re.compile(r'^(?:Analyze|Evaluate|Compare|Should we|Perform CBA on)\s+', re.IGNORECASE)
+_ANALYSIS_VERBS = ('include', 'perform', 'conduct', 'assess')
+_DEFAULT_FACTORS_CLAUSE = " Identify and compare key quantitative and qualitative costs and benefits over a relevant timeframe (e.g., 3-5 years)."
+_OUTPUT_SUGGESTION = " Present the results clearly, potentially using a table to list costs and benefits. Summarize the net benefit or loss and provide a recommendation based on the analysis."
+
 def cost_benefit_analysis(decision_or_scenario: str, comparison_factors: str = None, additional_analysis_requests: str = None) -> str:
   """
   Transforms a decision/scenario description into a detailed prompt for generating 
@@ -23,10 +31,9 @@ def cost_benefit_analysis(decision_or_scenario: str, comparison_factors: str = N
 
   # 1. Clean and normalize the input decision/scenario
   processed_decision = decision_or_scenario.strip()
-  # Simple regex to remove common leading phrases (can be expanded)
-  processed_decision = re.sub(r'^(Analyze|Evaluate|Compare|Should we|Perform CBA on)\s+', '', processed_decision, flags=re.IGNORECASE)
+  processed_decision = _LEAD_RE.sub('', processed_decision, count=1)
   # Capitalize the first letter and ensure it ends with punctuation.
-  processed_decision = processed_decision[0].upper() + processed_decision[1:]
+  processed_decision = cap_first(processed_decision)
   if not processed_decision.endswith(('.', '?', '!')):
       processed_decision += '.'
 
@@ -38,7 +45,7 @@ def cost_benefit_analysis(decision_or_scenario: str, comparison_factors: str = N
       factors_clause = f" Focus the comparison on factors such as: {comparison_factors.strip()}."
   else:
       # Provide generic guidance if no specifics are given
-      factors_clause = " Identify and compare key quantitative and qualitative costs and benefits over a relevant timeframe (e.g., 3-5 years)."
+      factors_clause = _DEFAULT_FACTORS_CLAUSE
 
   # 4. Add clause for additional analysis requests
   analysis_clause = ""
@@ -48,15 +55,12 @@ def cost_benefit_analysis(decision_or_scenario: str, comparison_factors: str = N
        if not add_req_cleaned.endswith('.'):
            add_req_cleaned += '.'
        # Make the prompt instruction clear
-       if not add_req_cleaned.lower().startswith(('include', 'perform', 'conduct', 'assess')):
+       if not add_req_cleaned.lower().startswith(_ANALYSIS_VERBS):
            analysis_clause = f" Also, include analysis on {add_req_cleaned.lower()}"
        else:
             analysis_clause = f" Also, {add_req_cleaned}" # Use provided instruction verb
 
-  # 5. Add suggestion for output structure/summary
-  output_suggestion = " Present the results clearly, potentially using a table to list costs and benefits. Summarize the net benefit or loss and provide a recommendation based on the analysis."
-
-  # 6. Assemble the final prompt
-  output_prompt = f"{prompt_start}{factors_clause}{analysis_clause}{output_suggestion}"
+  # 5. Assemble the final prompt, closing with the output-structure suggestion
+  output_prompt = "".join((prompt_start, factors_clause, analysis_clause, _OUTPUT_SUGGESTION))
 
   return output_prompt
\ No newline at end of file
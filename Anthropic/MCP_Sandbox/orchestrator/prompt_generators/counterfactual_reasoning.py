@@ -1,5 +1,12 @@
 import re
 
+from ._text import cap_first
+
+_PREMISE_RE = re.compile(r'^(?:What if|Imagine|Suppose)\s+', re.IGNORECASE)
+_WHATIF_RE = re.compile(r'^What if\s+', re.IGNORECASE)
+_IMAGINE_RE = re.compile(r'^(?:Imagine|Suppose)\s+', re.IGNORECASE)
+_DEFAULT_FOCUS_CLAUSE = " Include analysis of key turning points, major affected domains (e.g., technology, society, economy), and significant deviations from our actual timeline."
+
 def counterfactual_reasoning(premise: str, specific_focus_areas: str = None) -> str:
   """
   Transforms a counterfactual premise into a detailed prompt for exploring 
@@ -21,22 +28,22 @@ def counterfactual_reasoning(premise: str, specific_focus_areas: str = None) ->
   # 1. Clean and normalize the premise
   processed_premise = premise.strip()
   # Ensure it starts appropriately (often with "What if" or similar)
-  if not re.match(r'^(What if|Imagine|Suppose)\s+', processed_premise, flags=re.IGNORECASE):
+  if not _PREMISE_RE.match(processed_premise):
       # If it doesn't start like a question/premise, prepend "What if "
       if not processed_premise.endswith('?'):
           processed_premise = "What if " + processed_premise.strip('.') + "?"
       else: # It's already a question, likely okay
-          processed_premise = processed_premise[0].upper() + processed_premise[1:]
+          processed_premise = cap_first(processed_premise)
   else:
-       processed_premise = processed_premise[0].upper() + processed_premise[1:] # Capitalize first letter
+       processed_premise = cap_first(processed_premise) # Capitalize first letter
        if not processed_premise.endswith('?'):
            processed_premise += '?' # Ensure it ends with a question mark
 
   # 2. Construct the core request - adapt based on phrasing
   core_request = "Explore the potential consequences of this alternate scenario."
-  if re.match(r'^(What if)\s+', processed_premise, flags=re.IGNORECASE):
+  if _WHATIF_RE.match(processed_premise):
        core_request = "Simulate the likely outcomes and evolution resulting from this premise."
-  elif re.match(r'^(Imagine|Suppose)\s+', processed_premise, flags=re.IGNORECASE):
+  elif _IMAGINE_RE.match(processed_premise):
        core_request = "Describe the world or situation that might have resulted."
 
 
@@ -47,7 +54,7 @@ def counterfactual_reasoning(premise: str, specific_focus_areas: str = None) ->
           focus_clause += '.'
   else:
       # Provide generic guidance if no specifics are given
-      focus_clause = " Include analysis of key turning points, major affected domains (e.g., technology, society, economy), and significant deviations from our actual timeline."
+      focus_clause = _DEFAULT_FOCUS_CLAUSE
 
   # 4. Assemble the final prompt
   output_prompt = f"{processed_premise} {core_request}{focus_clause}"
@@ -1,9 +1,11 @@
 # orchestrator/prompt_generators/loader.py
-import importlib
-import inspect
+import functools
+import importlib.util
 import logging
 import os
+import sys
 from pathlib import Path
+from types import ModuleType
 from typing import Callable, Dict, List, Tuple
 
 logger = logging.getLogger("OrchestratorClient.PromptLoader")
@@ -13,58 +15,123 @@ PromptGeneratorFunc = Callable[[str], str]
 # Simpler type hint without optional args for loader:
 SimplePromptGeneratorFunc = Callable[[str], str]
 
+_LOADER_MODULE = Path(__file__).stem
+
+
+# Discovered generators per resolved directory, filled once per process
+_GENERATOR_CACHE: Dict[Path, Dict[str, "LazyGenerator"]] = {}
+
+
+def _accepts_problem_arg(func: Callable) -> bool:
+    """Cheap arity check: reads the code object instead of building an inspect.Signature."""
+    code = getattr(func, "__code__", None)
+    if code is not None:
+        return code.co_argcount + code.co_kwonlyargcount >= 1
+    import inspect # Only needed for callables without __code__ (builtins, partials, classes)
+    return len(inspect.signature(func).parameters) >= 1
+
+
+class LazyGenerator:
+    """
+    Stands in for a prompt generator whose module has not been executed yet.
+
+    The module body runs (via importlib.util.LazyLoader) on the first call; the
+    resolved function is checked, memoized and reused for every later call.
+    """
+    __slots__ = ("name", "module", "_func")
+
+    def __init__(self, name: str, module: ModuleType):
+        self.name = name
+        self.module = module
+        self._func: SimplePromptGeneratorFunc | None = None
+
+    def _resolve(self) -> SimplePromptGeneratorFunc:
+        func = getattr(self.module, self.name, None)
+        if not callable(func):
+            raise TypeError(f"Function '{self.name}' not found or not callable in {self.module.__name__}.")
+        if not _accepts_problem_arg(func): # Needs at least the main problem arg
+            raise TypeError(f"Generator '{self.name}' has an incorrect signature (needs at least one argument).")
+        # Generators are pure str -> str functions, so memoize them:
+        # a re-submitted problem skips regeneration entirely.
+        self._func = functools.lru_cache(maxsize=128)(func)
+        logger.debug(f"Resolved generator on first use: {self.name}")
+        return self._func
+
+    def __call__(self, *args, **kwargs) -> str:
+        func = self._func or self._resolve()
+        return func(*args, **kwargs)
+
+
+def _lazy_import(module_name: str, file_path: str) -> ModuleType:
+    """Registers a module whose body only executes on first attribute access."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    # The scan already located the file, so skip the sys.path finder search
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot build an import spec for {module_name}")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+    return module
+
+
+def _discover_generators(dir_path: Path) -> Dict[str, LazyGenerator]:
+    """Scans dir_path once per process and returns lazy stand-ins keyed by generator name."""
+    cached = _GENERATOR_CACHE.get(dir_path)
+    if cached is not None:
+        return cached
+
+    generators: Dict[str, LazyGenerator] = {}
+    logger.info(f"Loading prompt generators from: {dir_path}")
+
+    # One directory walk: DirEntry.is_file() reuses the type from the listing,
+    # so no per-file stat. Skips subpackages, private helpers and this loader itself.
+    with os.scandir(dir_path) as it:
+        py_files = [
+            (entry.name[:-3], entry.path) for entry in it
+            if entry.name.endswith(".py") and not entry.name.startswith("_") and entry.is_file()
+        ]
+
+    for module_name, file_path in py_files:
+        if module_name == _LOADER_MODULE:
+            continue
+        function_name = module_name # Assume function name matches module name
+        # Construct the full module path relative to the project structure
+        # This assumes 'orchestrator' is a package root or accessible via sys.path
+        module_path = f"orchestrator.prompt_generators.{module_name}"
+        try:
+            module = _lazy_import(module_path, file_path)
+            generators[function_name] = LazyGenerator(function_name, module)
+            logger.debug(f"Registered lazy generator: {function_name}")
+        except ImportError as e:
+            logger.error(f"Failed to import module {module_path}: {e}")
+        except Exception as e:
+            logger.error(f"Error loading generator from {module_name}: {e}")
+
+    logger.info(f"Loaded {len(generators)} prompt generators: {list(generators.keys())}")
+    _GENERATOR_CACHE[dir_path] = generators
+    return generators
+
 
 def load_prompt_generators(directory: str | Path = Path(__file__).parent) -> Dict[str, SimplePromptGeneratorFunc]:
     """
-    Dynamically loads prompt generator functions from .py files in a directory.
+    Discovers prompt generator functions from the modules in a directory.
 
     Assumes each .py file contains one primary function matching the filename
     (e.g., swot_analysis.py contains def swot_analysis(problem_statement: str) -> str).
     Adjust logic if function names differ or files contain multiple generators.
 
+    Discovery is memoized per directory, and generator modules are imported lazily:
+    each one only executes (and has its function/signature checked) on first call.
+    A missing or malformed generator therefore raises on that call rather than here.
+
     Args:
         directory: The directory containing the .py generator files.
 
     Returns:
-        A dictionary mapping generator names (e.g., "swot_analysis") to the callable functions.
+        A dictionary mapping generator names (e.g., "swot_analysis") to callables.
     """
-    generators: Dict[str, SimplePromptGeneratorFunc] = {}
-    dir_path = Path(directory)
-    logger.info(f"Loading prompt generators from: {dir_path.resolve()}")
-
-    for filename in os.listdir(dir_path):
-        if filename.endswith(".py") and not filename.startswith("_"):
-            module_name = filename[:-3]  # Remove .py extension
-            function_name = module_name # Assume function name matches module name
-            try:
-                # Construct the full module path relative to the project structure
-                # This assumes 'orchestrator' is a package root or accessible via sys.path
-                module_path = f"orchestrator.prompt_generators.{module_name}"
-                module = importlib.import_module(module_path)
-
-                if hasattr(module, function_name):
-                    func = getattr(module, function_name)
-                    # Basic check: ensure it's a callable function
-                    # More robust check: inspect signature to ensure it takes one string arg
-                    if callable(func):
-                         # Simplified check: We assume it takes one arg for loading.
-                         # Runtime call will handle type errors if signature is wrong.
-                        sig = inspect.signature(func)
-                        if len(sig.parameters) >= 1: # Needs at least the main problem arg
-                             # Store the function directly
-                             generators[function_name] = func
-                             logger.debug(f"Successfully loaded generator: {function_name}")
-                        else:
-                             logger.warning(f"Skipping {function_name} in {filename}: Incorrect signature (needs at least one argument).")
-
-                    else:
-                        logger.warning(f"Skipping {function_name} in {filename}: Not a callable function.")
-                else:
-                    logger.warning(f"Skipping {filename}: Function '{function_name}' not found.")
-            except ImportError as e:
-                logger.error(f"Failed to import module {module_path}: {e}")
-            except Exception as e:
-                logger.error(f"Error loading generator from {filename}: {e}")
-
-    logger.info(f"Loaded {len(generators)} prompt generators: {list(generators.keys())}")
-    return generators
\ No newline at end of file
+    return dict(_discover_generators(Path(directory).resolve()))
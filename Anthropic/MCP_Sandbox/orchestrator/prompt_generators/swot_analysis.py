@@ -1,6 +1,11 @@
 # orchestrator/prompt_generators/swot_analysis.py
 import re
 
+from ._text import cap_first
+
+_TERMINAL_SET = frozenset(".?!")
+_LEAD_VERB_RE = re.compile(r'^(?:Analyze|Evaluate|Consider|Perform a SWOT on)\s+', re.IGNORECASE)
+
 def swot_analysis(subject_or_context: str, specific_considerations: str = None) -> str:
   """
   Transforms a subject/context into a detailed prompt for generating
@@ -9,9 +14,9 @@ def swot_analysis(subject_or_context: str, specific_considerations: str = None)
   """
   # 1. Clean and normalize the input subject/context
   processed_subject = subject_or_context.strip()
-  processed_subject = re.sub(r'^(Analyze|Evaluate|Consider|Perform a SWOT on)\s+', '', processed_subject, flags=re.IGNORECASE)
-  processed_subject = processed_subject[0].upper() + processed_subject[1:]
-  if not processed_subject.endswith(('.', '?', '!')):
+  processed_subject = _LEAD_VERB_RE.sub('', processed_subject, count=1)
+  processed_subject = cap_first(processed_subject)
+  if not processed_subject or processed_subject[-1] not in _TERMINAL_SET:
       processed_subject += '.'
 
   # 2. Construct the core request
@@ -20,7 +25,7 @@ def swot_analysis(subject_or_context: str, specific_considerations: str = None)
   # 3. Add specific considerations if provided, otherwise add generic guidance
   if specific_considerations and specific_considerations.strip():
       considerations_clause = f" considering {specific_considerations.strip()}"
-      if not considerations_clause.endswith('.'):
+      if considerations_clause[-1] != '.':
           considerations_clause += '.'
   else:
       considerations_clause = " identifying key internal (Strengths, Weaknesses) and external (Opportunities, Threats) factors."
@@ -1,5 +1,7 @@
 # mcp_server/core/security.py
+import functools
 import os
+import stat
 from pathlib import Path
 from typing import TYPE_CHECKING
 
@@ -10,6 +12,69 @@ class SandboxViolationError(PermissionError):
     """Custom exception for attempts to access paths outside the sandbox."""
     pass
 
+@functools.lru_cache(maxsize=1)
+def _canonical_root(sandbox: str) -> str:
+    """Canonical (symlink-free) sandbox root; DIRECTORY_SANDBOX is fixed for the process lifetime."""
+    return os.path.realpath(sandbox)
+
+# workspace_id -> absolute workspace root, joined once and reused by every tool call.
+# Filled eagerly by create_workspace and lazily (after a restart) for workspaces that
+# exist on disk. Only canonical single-component IDs ('ws_x', not 'ws_x/.' or an
+# absolute path) are cached, so it holds at most one entry per real workspace.
+# DIRECTORY_SANDBOX is fixed for the process lifetime, so workspace_id alone is the key.
+_WORKSPACE_ROOTS: dict[str, str] = {}
+
+def _workspace_root(sandbox: str, workspace_id: str) -> str:
+    """
+    Root of one workspace.
+
+    Joined and normalized lexically against the already-resolved sandbox root, so
+    there is no getcwd/lstat walk. A symlinked workspace directory therefore fails
+    the target containment check below instead of being followed.
+    Hidden top-level directories (e.g. '.snapshots') are reserved for the server.
+    """
+    workspace_root = _WORKSPACE_ROOTS.get(workspace_id)
+    if workspace_root is not None:
+        return workspace_root
+    sandbox_root = _canonical_root(sandbox)
+    workspace_root = os.path.normpath(os.path.join(sandbox_root, workspace_id))
+    relative_root = os.path.relpath(workspace_root, sandbox_root)
+    top_level = relative_root.partition(os.sep)[0]
+    if top_level == ".": # e.g. '.' or 'ws1/..': relative paths would reach every workspace and '.snapshots'
+        raise SandboxViolationError(f"Workspace ID '{workspace_id}' refers to the sandbox root, not a workspace.")
+    if top_level.startswith(".") and top_level != "..": # '..' fails the containment check
+        raise SandboxViolationError(f"Workspace ID '{workspace_id}' refers to a reserved server directory.")
+    # Aliases of the same directory are validated but not cached; neither are missing workspaces
+    if workspace_id == relative_root == top_level and os.path.isdir(workspace_root):
+        _WORKSPACE_ROOTS[workspace_id] = workspace_root
+    return workspace_root
+
+def register_workspace_root(workspace_id: str, workspace_root: str) -> None:
+    """Caches the root of a just-created workspace (as returned by resolve_and_validate_path_str)."""
+    _WORKSPACE_ROOTS[workspace_id] = workspace_root
+
+def forget_workspace_root(workspace_id: str) -> None:
+    """Drops the cached root of a workspace; call after deleting it."""
+    _WORKSPACE_ROOTS.pop(workspace_id, None)
+
+def _is_within(path: str, root: str) -> bool:
+    """Component-wise containment on normalized paths: '/sandbox/ws' does not contain '/sandbox/ws1'."""
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+def _has_symlink(root: str, path: str) -> bool:
+    """lstat()s each component of path below root, stopping at the first one that doesn't exist."""
+    current = root
+    for part in path[len(root):].split(os.sep):
+        if not part:
+            continue
+        current = os.path.join(current, part)
+        try:
+            if stat.S_ISLNK(os.lstat(current).st_mode):
+                return True
+        except (FileNotFoundError, NotADirectoryError):
+            return False # Nothing below a missing component can be a symlink
+    return False
+
 def resolve_and_validate_path(
     config: "Settings", # Pass your loaded config object here
     workspace_id: str,
@@ -17,10 +82,26 @@ def resolve_and_validate_path(
     ensure_parent_exists: bool = False,
     check_existence: bool = False, # Set to True if the path itself must exist
 ) -> Path:
+    """
+    Path-returning form of resolve_and_validate_path_str, for callers off the
+    per-request hot path. Takes the same arguments and raises the same errors.
+    """
+    return Path(resolve_and_validate_path_str(config, workspace_id, relative_path,
+                                              ensure_parent_exists, check_existence))
+
+def resolve_and_validate_path_str(
+    config: "Settings", # Pass your loaded config object here
+    workspace_id: str,
+    relative_path: str,
+    ensure_parent_exists: bool = False,
+    check_existence: bool = False, # Set to True if the path itself must exist
+) -> str:
     """
     Resolves a relative path within a specific workspace inside the main sandbox
     and validates that it does not escape the sandbox boundaries.
 
+    Works on plain strings (os.path) throughout, with no pathlib objects built per call.
+
     Args:
         config: The loaded server configuration containing DIRECTORY_SANDBOX.
         workspace_id: The unique identifier for the agent's current task workspace.
@@ -29,7 +110,7 @@ def resolve_and_validate_path(
         check_existence: If True, raises an error if the final resolved path doesn't exist.
 
     Returns:
-        The resolved, validated absolute Path object.
+        The resolved, validated absolute path.
 
     Raises:
         ValueError: If workspace_id or relative_path are invalid or empty.
@@ -43,36 +124,41 @@ def resolve_and_validate_path(
     if not config.DIRECTORY_SANDBOX:
          raise ValueError("DIRECTORY_SANDBOX is not configured.")
 
-    # Basic check for directory traversal attempts in relative path input
-    # normpath helps normalize separators and collapses '..' where possible upfront
-    normalized_relative_path = os.path.normpath(relative_path)
-    if normalized_relative_path.startswith("..") or "/../" in normalized_relative_path or "\\..\\" in normalized_relative_path:
+    # Basic check for directory traversal attempts in relative path input:
+    # plain string checks, before any joining, reject '..' components and absolute paths
+    if ".." in relative_path.split(os.sep):
          raise SandboxViolationError(f"Invalid relative path contains '..': {relative_path}")
+    if os.path.isabs(relative_path):
+         raise SandboxViolationError(f"Relative path must not be absolute: {relative_path}")
 
-    sandbox_root = Path(config.DIRECTORY_SANDBOX).resolve()
-    workspace_root = (sandbox_root / workspace_id).resolve()
-    target_path = (workspace_root / normalized_relative_path).resolve()
+    sandbox_root = _canonical_root(config.DIRECTORY_SANDBOX)
+    workspace_root = _workspace_root(config.DIRECTORY_SANDBOX, workspace_id)
+    target = os.path.normpath(os.path.join(workspace_root, relative_path))
+    # join + normpath can't see symlinks; only pay for a full realpath() walk when
+    # a component below the (already canonical) sandbox root actually is one
+    if _has_symlink(sandbox_root, target):
+        target = os.path.realpath(target)
 
     # --- Crucial Security Check ---
-    # Ensure the resolved workspace_root is within the sandbox_root
-    if not str(workspace_root).startswith(str(sandbox_root)):
+    # Ensure the workspace_root is within the sandbox_root
+    if not _is_within(workspace_root, sandbox_root):
         raise SandboxViolationError(f"Workspace directory '{workspace_id}' is outside the sandbox '{sandbox_root}'.")
 
-    # Ensure the final resolved target_path is still within the specific workspace_root
+    # Ensure the final resolved target is still within the specific workspace_root
     # (This is the primary defense against path traversal)
-    if not str(target_path).startswith(str(workspace_root)):
-        raise SandboxViolationError(f"Path traversal attempt detected. Resolved path '{target_path}' is outside the workspace '{workspace_root}'.")
+    if not _is_within(target, workspace_root):
+        raise SandboxViolationError(f"Path traversal attempt detected. Resolved path '{target}' is outside the workspace '{workspace_root}'.")
+    # Hidden top-level directories (e.g. '.snapshots') are never reachable, whatever the workspace
+    if target[len(sandbox_root.rstrip(os.sep)) + 1:].startswith("."):
+        raise SandboxViolationError(f"Path '{target}' is inside a reserved server directory.")
 
     # Optional: Ensure parent directories exist if writing a file
     if ensure_parent_exists:
-        target_path.parent.mkdir(parents=True, exist_ok=True)
-        # Re-validate after potential mkdir to be absolutely sure
-        if not str(target_path.parent).startswith(str(workspace_root)):
-             raise SandboxViolationError("Parent directory creation resulted in path outside workspace.")
-
+        # target was proven to be inside workspace_root above, so its parent is too
+        os.makedirs(os.path.dirname(target), exist_ok=True)
 
     # Optional: Check if the file/directory itself should exist
-    if check_existence and not target_path.exists():
-        raise FileNotFoundError(f"Required path does not exist: {target_path}")
+    if check_existence and not os.path.exists(target):
+        raise FileNotFoundError(f"Required path does not exist: {target}")
 
-    return target_path
+    return target
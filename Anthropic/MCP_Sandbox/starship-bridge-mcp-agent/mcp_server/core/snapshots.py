@@ -0,0 +1,91 @@
+# mcp_server/core/snapshots.py
+import re
+import shutil
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from mcp_server.core.security import resolve_and_validate_path, SandboxViolationError
+
+if TYPE_CHECKING:
+    from mcp_server.config import Settings
+
+# Snapshots live in <DIRECTORY_SANDBOX>/.snapshots/<workspace_id>/<snapshot_id>.
+# Hidden top-level directories can't be used as workspace IDs, so tools can't touch them.
+SNAPSHOT_DIR_NAME = ".snapshots"
+AUTO_SNAPSHOT_ID = "snap_auto" # Replaced by every automatic snapshot of a workspace
+_SNAPSHOT_ID_RE = re.compile(r'snap_(?:auto|[0-9a-f]{8})')
+
+def new_snapshot_id() -> str:
+    return f"snap_{uuid.uuid4().hex[:8]}"
+
+def _copy_tree(source: Path, destination: Path) -> None:
+    """
+    Copies a directory tree, preserving symlinks, modes and timestamps.
+
+    On Linux, GNU cp clones data blocks copy-on-write where the filesystem supports
+    it (btrfs, XFS), making the copy near-instant; elsewhere it is a regular copy.
+    Hardlinks (cp -al) are not used: in-place writes to a file would silently
+    change the snapshot too.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            subprocess.run(
+                ["cp", "-a", "--reflink=auto", str(source), str(destination)],
+                capture_output=True, text=True, check=True
+            )
+        except subprocess.CalledProcessError as e:
+            raise OSError(f"Copying '{source}' failed: {e.stderr.strip()}") from e
+    else:
+        shutil.copytree(source, destination, symlinks=True)
+
+def _replace_tree(source: Path, target: Path) -> None:
+    """Copies source to target; an existing target is only swapped out once the copy is complete."""
+    staging = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}")
+    try:
+        _copy_tree(source, staging)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    if not target.exists():
+        staging.rename(target)
+        return
+    discarded = staging.with_name(f"{staging.name}.old")
+    target.rename(discarded)
+    staging.rename(target)
+    shutil.rmtree(discarded, ignore_errors=True)
+
+def _snapshot_paths(config: "Settings", workspace_id: str, snapshot_id: str) -> tuple[Path, Path]:
+    """Validates both IDs and returns (workspace_path, snapshot_path)."""
+    if not _SNAPSHOT_ID_RE.fullmatch(snapshot_id or ""):
+        raise ValueError(f"Invalid snapshot ID: '{snapshot_id}'.")
+    workspace_path = resolve_and_validate_path(
+        config=config,
+        workspace_id=workspace_id,
+        relative_path=".",
+        check_existence=True # Only existing workspaces can be snapshotted/restored
+    )
+    if not workspace_path.is_dir():
+        raise NotADirectoryError(f"Workspace path is not a directory: {workspace_path}")
+    sandbox_root = Path(config.DIRECTORY_SANDBOX).resolve()
+    if workspace_path == sandbox_root:
+        raise SandboxViolationError("The sandbox root itself is not a workspace.")
+    snapshot_path = sandbox_root / SNAPSHOT_DIR_NAME / workspace_path.relative_to(sandbox_root) / snapshot_id
+    return workspace_path, snapshot_path
+
+def create_snapshot(config: "Settings", workspace_id: str, snapshot_id: str) -> Path:
+    """Copies the workspace into the snapshot (replacing an older one with the same ID)."""
+    workspace_path, snapshot_path = _snapshot_paths(config, workspace_id, snapshot_id)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    _replace_tree(workspace_path, snapshot_path)
+    return snapshot_path
+
+def restore_snapshot(config: "Settings", workspace_id: str, snapshot_id: str) -> Path:
+    """Replaces the workspace contents with the snapshot; the snapshot itself is kept for reuse."""
+    workspace_path, snapshot_path = _snapshot_paths(config, workspace_id, snapshot_id)
+    if not snapshot_path.is_dir():
+        raise FileNotFoundError(f"Snapshot '{snapshot_id}' does not exist for workspace '{workspace_id}'.")
+    _replace_tree(snapshot_path, workspace_path)
+    return workspace_path
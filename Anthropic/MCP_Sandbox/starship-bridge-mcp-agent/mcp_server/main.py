@@ -1,14 +1,15 @@
 # mcp_server/main.py
 import anyio
+import functools
+import importlib
 import logging
+import pkgutil
 from pathlib import Path
-from mcp.server.fastmcp import FastMCP
-from mcp_server.config import Settings # Import the Settings model
 
 # --- Load configuration EARLY ---
 # (Keep existing config loading and validation logic here...)
 try:
-    config = Settings() # This reads .env automatically via pydantic-settings
+    from mcp_server.runtime import SETTINGS as config # Settings are parsed when runtime is first imported
 
     # *** Validate DIRECTORY_SANDBOX ***
     if not config.DIRECTORY_SANDBOX:
@@ -29,22 +30,28 @@ except Exception as e:
      exit(1)
 
 
-# --- Initialize FastMCP ---
-bridge_mcp_server = FastMCP("StarshipBridgeAgentBackend")
+# --- FastMCP instance (created in runtime.py, shared with the tool modules) ---
+from mcp_server.runtime import bridge_mcp_server
 
 
 # --- Import tool modules AFTER server instance and config are ready ---
-# This ensures the @bridge_mcp_server.tool() decorators run and register the tools
-from mcp_server.tools import file_system
-from mcp_server.tools import git
-from mcp_server.tools import build_deploy
-from mcp_server.tools import workspace # <<< ADD THIS LINE
-
-# --- Planned Future Tool Imports (Add as they are implemented) ---
-# from mcp_server.tools import aws
-# from mcp_server.tools import stripe
-# from mcp_server.tools import testing
-# from mcp_server.tools import shell
+# This ensures the @bridge_mcp_server.tool() decorators run and register the tools.
+# Every module in mcp_server/tools/ is picked up, so new tool modules
+# (aws, stripe, testing, shell, ...) only need to be dropped into that directory.
+@functools.cache
+def register_tool_modules() -> tuple[str, ...]:
+    """Imports each public mcp_server.tools module once; returns the names registered."""
+    import mcp_server.tools as tools_pkg
+    registered = []
+    for module_info in pkgutil.iter_modules(tools_pkg.__path__):
+        if module_info.name.startswith("_"):
+            continue
+        importlib.import_module(f"mcp_server.tools.{module_info.name}")
+        registered.append(module_info.name)
+    logging.info(f"Registered tool modules: {registered}")
+    return tuple(registered)
+
+register_tool_modules()
 
 
 # --- Main Run Function ---
@@ -0,0 +1,39 @@
+# mcp_server/runtime.py
+# Process-wide server objects. Tool modules import these from here rather than from
+# main.py, so running main.py as a script doesn't re-execute it via a circular import
+# (which registered the tools on a second FastMCP instance).
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, TypeVar
+from mcp.server.fastmcp import FastMCP
+from mcp_server.config import Settings
+
+@functools.cache
+def get_settings() -> Settings:
+    """Parses .env / environment once per process; every caller shares the instance."""
+    return Settings() # This reads .env automatically via pydantic-settings
+
+SETTINGS: Settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Exposes the validated settings to tools via ctx.request_context.lifespan_context."""
+    yield {"config": get_settings()}
+
+bridge_mcp_server = FastMCP("StarshipBridgeAgentBackend", lifespan=lifespan)
+
+
+# Dedicated threads for blocking file-system I/O, so file tools neither queue behind
+# (nor starve) other blocking work on the default executor (snapshots, subprocess helpers).
+# Sized for I/O concurrency rather than CPU count.
+_FS_POOL = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4), thread_name_prefix="mcp-fs")
+
+T = TypeVar("T")
+
+async def run_fs(func: Callable[..., T], *args) -> T:
+    """Runs a blocking file-system call on the shared mcp-fs thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(_FS_POOL, func, *args)
@@ -1,23 +1,172 @@
 # mcp_server/tools/file_system.py
+import asyncio
+import codecs
+import collections
+import importlib
+import itertools
 import logging
-from pathlib import Path
+import os
+import stat
+import sys
+import threading
+import time
 from typing import TYPE_CHECKING
 
-# Assuming FastMCP instance is created in main.py and accessible
-# You might need to adjust how 'bridge_mcp_server' and 'config' are accessed
-# depending on your project structure (e.g., passing them around, using globals - careful!)
-# For simplicity, let's assume they are accessible here.
-# A better approach is often dependency injection via the lifespan context.
-from mcp_server.main import bridge_mcp_server, config # Adjust import as needed
-from mcp_server.core.security import resolve_and_validate_path, SandboxViolationError
+# The FastMCP instance and settings live in runtime.py (not main.py), so importing
+# them here doesn't re-enter main.py. The settings are also exposed to tools via
+# the lifespan context (ctx.request_context.lifespan_context["config"]).
+from mcp_server.runtime import bridge_mcp_server, run_fs, SETTINGS as config
+from mcp_server.core.security import resolve_and_validate_path_str, SandboxViolationError
 
 if TYPE_CHECKING:
     from mcp_server.config import Settings
 
 logger = logging.getLogger(__name__)
 
+# File I/O runs on the mcp-fs thread pool (runtime.run_fs) so a slow disk doesn't
+# stall the event loop (and every other in-flight tool call). So does path validation,
+# which stat()s, lstat()s and may create parent directories: one hop validates (a whole
+# batch at once for read_files/write_files), and each I/O helper does open + I/O + close.
+# Whole-file reads/writes go through raw, unbuffered FileIO with an explicit
+# UTF-8 codec: no BufferedReader/TextIOWrapper setup and fewer syscalls.
+# Content above _CHUNKED_WRITE_THRESHOLD characters is encoded and written in
+# _WRITE_CHUNK_CHARS slices, so the full encoded copy never sits next to the str.
+_CHUNKED_WRITE_THRESHOLD = 1 << 20
+_WRITE_CHUNK_CHARS = 1 << 16
+
+def _write_all(f, data: bytes) -> None:
+    view = memoryview(data)
+    while view: # Raw writes may be partial
+        view = view[f.write(view):]
+
+def _sync_write(path: str, content: str) -> None:
+    with open(path, 'wb', buffering=0) as f:
+        if len(content) <= _CHUNKED_WRITE_THRESHOLD:
+            _write_all(f, content.encode('utf-8'))
+            return
+        for start in range(0, len(content), _WRITE_CHUNK_CHARS):
+            _write_all(f, content[start:start + _WRITE_CHUNK_CHARS].encode('utf-8'))
+
+def _sync_read(path: str) -> str:
+    with open(path, 'rb', buffering=0) as f:
+        raw = f.read()
+    return raw.decode('utf-8')
+
+# Optional kernel-side async file I/O via caio (io_uring, else Linux AIO): data
+# transfers are submitted to the kernel from the event loop. open/fstat/close are
+# blocking syscalls too, so they still go through the mcp-fs pool.
+# Used when caio is installed on Linux; otherwise (or if the kernel refuses the
+# context, e.g. io_uring disabled by seccomp) file I/O stays on the mcp-fs pool.
+# Note that Linux AIO on buffered (non-O_DIRECT) files completes synchronously
+# inside io_submit(); only the io_uring backend is truly asynchronous here.
+_AIO_MAX_REQUESTS = 128 # Queue depth
+_AioContext = None
+if sys.platform == "linux":
+    for _backend in ("caio.linux_uring_asyncio", "caio.linux_aio_asyncio"):
+        try:
+            _AioContext = importlib.import_module(_backend).AsyncioContext
+            break
+        except ImportError:
+            continue
+_aio_context = None
+
+def _get_aio_context():
+    """Returns the caio context for the running event loop, creating it on first use."""
+    global _AioContext, _aio_context
+    if _AioContext is None:
+        return None
+    loop = asyncio.get_running_loop()
+    if _aio_context is None or _aio_context.loop is not loop: # Contexts are bound to one loop
+        if _aio_context is not None:
+            try:
+                _aio_context.close() # Release the previous loop's ring/eventfd
+            except Exception as e:
+                logger.warning(f"Failed to close the previous kernel async I/O context: {e}")
+            _aio_context = None
+        try:
+            _aio_context = _AioContext(max_requests=_AIO_MAX_REQUESTS, loop=loop)
+            logger.info(f"Using kernel async file I/O: {_AioContext.__module__}")
+        except OSError as e:
+            logger.warning(f"Kernel async file I/O unavailable ({e}); using the thread pool instead.")
+            _AioContext = _aio_context = None
+    return _aio_context
+
+def _open_for_read(path: str) -> tuple[int, int]:
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        return fd, os.fstat(fd).st_size
+    except BaseException:
+        os.close(fd)
+        raise
+
+async def _read_text(path: str) -> str:
+    ctx = _get_aio_context()
+    if ctx is None:
+        return await run_fs(_sync_read, path)
+    fd, size = await run_fs(_open_for_read, path)
+    try:
+        chunks, offset = [], 0
+        while True:
+            chunk = await ctx.read(max(size - offset, _STREAM_CHUNK_SIZE), fd, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+            if offset >= size:
+                break
+    finally:
+        await asyncio.shield(run_fs(os.close, fd)) # Closed even if the read was cancelled
+    return b"".join(chunks).decode('utf-8')
+
+async def _write_text(path: str, content: str) -> None:
+    ctx = _get_aio_context()
+    if ctx is None or len(content) > _CHUNKED_WRITE_THRESHOLD: # Large payloads keep the chunked path
+        await run_fs(_sync_write, path, content)
+        return
+    data = content.encode('utf-8')
+    fd = await run_fs(os.open, path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o666)
+    try:
+        offset = await ctx.write(data, fd, 0)
+        while offset < len(data): # Partial write
+            offset += await ctx.write(data[offset:], fd, offset)
+    finally:
+        await asyncio.shield(run_fs(os.close, fd)) # Closed even if the write was cancelled
+
+# read_file_stream hands large files back one block at a time (128 KiB, the
+# proposed io.DEFAULT_BUFFER_SIZE) instead of materializing them in one response
+_STREAM_CHUNK_SIZE = 128 * 1024
+
+def _sync_read_chunk(path: str, offset: int) -> tuple[str, int, bool]:
+    """Returns (text, next_offset, eof); a character split by the block boundary is left for the next read."""
+    with open(path, 'rb', buffering=0) as f:
+        f.seek(offset)
+        raw = f.read(_STREAM_CHUNK_SIZE)
+        eof = f.tell() >= os.fstat(f.fileno()).st_size
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    text = decoder.decode(raw, final=eof)
+    pending = len(decoder.getstate()[0])
+    return text, offset + len(raw) - pending, eof
+
+def _resolve_file(workspace_id: str, relative_path: str, ensure_parent_exists: bool = False,
+                  must_be_file: bool = False) -> str:
+    """Validates one path (run via run_fs); with must_be_file it must be an existing regular file."""
+    absolute_path = resolve_and_validate_path_str(
+        config=config,
+        workspace_id=workspace_id,
+        relative_path=relative_path,
+        ensure_parent_exists=ensure_parent_exists,
+        check_existence=must_be_file # Ensure the file exists before reading
+    )
+    if must_be_file and not os.path.isfile(absolute_path):
+        raise FileNotFoundError(f"Path exists but is not a file: {absolute_path}")
+    return absolute_path
+
+def _resolve_files(workspace_id: str, relative_paths: list[str], must_be_file: bool) -> list[str]:
+    """Validates a batch of paths in one thread hop; stops at the first invalid one."""
+    return [_resolve_file(workspace_id, relative_path, must_be_file=must_be_file) for relative_path in relative_paths]
+
 @bridge_mcp_server.tool()
-def write_file(workspace_id: str, relative_path: str, content: str) -> bool:
+async def write_file(workspace_id: str, relative_path: str, content: str) -> bool:
     """
     Writes text content to a specified file within the agent's sandboxed workspace.
     Creates parent directories if they don't exist. Overwrites the file if it exists.
@@ -38,17 +187,12 @@ def write_file(workspace_id: str, relative_path: str, content: str) -> bool:
     """
     logger.info(f"Attempting to write file '{relative_path}' in workspace '{workspace_id}'")
     try:
-        # Resolve and validate the path *within* the specific workspace sandbox
-        # Pass the loaded config object to the validator
-        absolute_path = resolve_and_validate_path(
-            config=config, # Pass loaded config here
-            workspace_id=workspace_id,
-            relative_path=relative_path,
-            ensure_parent_exists=True # Create parent dirs for the file
-        )
+        # Resolve and validate the path *within* the specific workspace sandbox,
+        # creating parent dirs for the file
+        absolute_path = await run_fs(_resolve_file, workspace_id, relative_path, True)
 
         # Write the content
-        absolute_path.write_text(content, encoding='utf-8')
+        await _write_text(absolute_path, content)
         logger.info(f"Successfully wrote to {absolute_path}")
         return True
 
@@ -67,7 +211,7 @@ def write_file(workspace_id: str, relative_path: str, content: str) -> bool:
 # --- using the same resolve_and_validate_path helper function ---
 
 @bridge_mcp_server.tool()
-def read_file(workspace_id: str, relative_path: str) -> str:
+async def read_file(workspace_id: str, relative_path: str) -> str:
     """
     Reads text content from a specified file within the agent's sandboxed workspace.
 
@@ -86,17 +230,9 @@ def read_file(workspace_id: str, relative_path: str) -> str:
     """
     logger.info(f"Attempting to read file '{relative_path}' in workspace '{workspace_id}'")
     try:
-        absolute_path = resolve_and_validate_path(
-            config=config,
-            workspace_id=workspace_id,
-            relative_path=relative_path,
-            check_existence=True # Ensure the file exists before reading
-        )
-
-        if not absolute_path.is_file():
-             raise FileNotFoundError(f"Path exists but is not a file: {absolute_path}")
+        absolute_path = await run_fs(_resolve_file, workspace_id, relative_path, False, True) # Must be an existing file
 
-        content = absolute_path.read_text(encoding='utf-8')
+        content = await _read_text(absolute_path)
         logger.info(f"Successfully read file {absolute_path}")
         return content
 
@@ -110,43 +246,221 @@ def read_file(workspace_id: str, relative_path: str) -> str:
         logger.exception(f"Unexpected error reading file {relative_path} in {workspace_id}: {e}")
         raise
 
+def _make_parent_dirs(paths: list[str]) -> None:
+    for parent in {os.path.dirname(path) for path in paths}:
+        os.makedirs(parent, exist_ok=True)
+
+@bridge_mcp_server.tool()
+async def write_files(workspace_id: str, files: list[dict[str, str]]) -> bool:
+    """
+    Writes several text files in one call within the agent's sandboxed workspace.
+    Prefer this over repeated write_file calls. Creates parent directories and
+    overwrites existing files, like write_file.
+
+    Every path is validated before anything is written: one invalid path fails
+    the whole call without touching any file. The writes then run concurrently.
+
+    Args:
+        workspace_id: The unique ID of the current agent workspace.
+        files: A list of {"path": <relative path>, "content": <text>} objects.
+               Each path may appear only once.
+
+    Returns:
+        True if every write was successful.
+
+    Raises:
+        ValueError: If workspace_id, a path or the files list are invalid.
+        SandboxViolationError: If any path attempts to go outside the workspace.
+        IOError: If there's an error writing a file.
+    """
+    logger.info(f"Attempting to write {len(files)} files in workspace '{workspace_id}'")
+    try:
+        for entry in files:
+            if not isinstance(entry, dict) or not isinstance(entry.get("path"), str) or not isinstance(entry.get("content"), str):
+                raise ValueError(f"Each file must be an object with string 'path' and 'content' fields, got: {entry!r}")
+        # Parent dirs are created once every entry is valid
+        absolute_paths = await run_fs(_resolve_files, workspace_id, [entry["path"] for entry in files], False)
+        targets = list(zip(absolute_paths, (entry["content"] for entry in files)))
+        if len({path for path, _ in targets}) != len(targets):
+            raise ValueError("The same file appears more than once in 'files'.")
+
+        await run_fs(_make_parent_dirs, [path for path, _ in targets])
+        await asyncio.gather(*(_write_text(path, content) for path, content in targets))
+        logger.info(f"Successfully wrote {len(targets)} files in workspace '{workspace_id}'")
+        return True
+
+    except (ValueError, SandboxViolationError) as sec_err:
+        logger.error(f"Security error writing files: {sec_err}")
+        raise
+    except IOError as io_err:
+        logger.error(f"IO error writing files in {workspace_id}: {io_err}")
+        raise IOError(f"Failed to write files: {io_err}")
+    except Exception as e:
+        logger.exception(f"Unexpected error writing files in {workspace_id}: {e}")
+        raise
+
+@bridge_mcp_server.tool()
+async def read_files(workspace_id: str, relative_paths: list[str]) -> list[str]:
+    """
+    Reads several text files in one call within the agent's sandboxed workspace.
+    Prefer this over repeated read_file calls.
+
+    Args:
+        workspace_id: The unique ID of the current agent workspace.
+        relative_paths: The paths of the files, relative to the workspace root.
+
+    Returns:
+        The file contents, in the same order as relative_paths.
+
+    Raises:
+        ValueError: If workspace_id or any path is invalid.
+        SandboxViolationError: If any path attempts to go outside the workspace.
+        FileNotFoundError: If any file does not exist.
+        IOError: If there's an error reading a file.
+    """
+    logger.info(f"Attempting to read {len(relative_paths)} files in workspace '{workspace_id}'")
+    try:
+        absolute_paths = await run_fs(_resolve_files, workspace_id, relative_paths, True) # Must be existing files
+
+        contents = await asyncio.gather(*(_read_text(path) for path in absolute_paths))
+        logger.info(f"Successfully read {len(contents)} files in workspace '{workspace_id}'")
+        return list(contents)
+
+    except (ValueError, SandboxViolationError, FileNotFoundError) as err:
+        logger.error(f"Error reading files: {err}")
+        raise
+    except IOError as io_err:
+        logger.error(f"IO error reading files in {workspace_id}: {io_err}")
+        raise IOError(f"Failed to read files: {io_err}")
+    except Exception as e:
+        logger.exception(f"Unexpected error reading files in {workspace_id}: {e}")
+        raise
+
 @bridge_mcp_server.tool()
-def list_directory(workspace_id: str, relative_path: str = ".") -> list[str]:
+async def read_file_stream(workspace_id: str, relative_path: str, offset: int = 0) -> dict:
+    """
+    Reads a large text file in 128 KiB blocks within the agent's sandboxed workspace.
+    Call repeatedly, passing the returned next_offset, until eof is True.
+
+    Args:
+        workspace_id: The unique ID of the current agent workspace.
+        relative_path: The path to the file, relative to the workspace root.
+        offset: Byte offset to read from (0, or next_offset from the previous call).
+
+    Returns:
+        A dictionary containing:
+        - content (str): The decoded text of this block.
+        - next_offset (int): The byte offset to pass to the next call.
+        - eof (bool): True if this block reaches the end of the file.
+
+    Raises:
+        ValueError: If workspace_id, relative_path or offset are invalid.
+        SandboxViolationError: If the path attempts to go outside the workspace.
+        FileNotFoundError: If the file does not exist at the specified path.
+        IOError: If there's an error reading the file.
+    """
+    logger.info(f"Attempting to stream file '{relative_path}' in workspace '{workspace_id}' from offset {offset}")
+    try:
+        if offset < 0:
+            raise ValueError(f"Offset must be >= 0 (got {offset}).")
+        absolute_path = await run_fs(_resolve_file, workspace_id, relative_path, False, True) # Must be an existing file
+
+        content, next_offset, eof = await run_fs(_sync_read_chunk, absolute_path, offset)
+        logger.info(f"Successfully read {next_offset - offset} bytes of {absolute_path}")
+        return {"content": content, "next_offset": next_offset, "eof": eof}
+
+    except (ValueError, SandboxViolationError, FileNotFoundError) as err:
+        logger.error(f"Error streaming file: {err}")
+        raise # Re-raise known errors
+    except IOError as io_err:
+        logger.error(f"IO error streaming file {relative_path} in {workspace_id}: {io_err}")
+        raise IOError(f"Failed to read file: {io_err}")
+    except Exception as e:
+        logger.exception(f"Unexpected error streaming file {relative_path} in {workspace_id}: {e}")
+        raise
+
+# Recently listed directory pages, keyed by (absolute path, offset, limit). An entry
+# is reused while the directory's (st_mtime_ns, st_ino) is unchanged: any entry being
+# added, removed or renamed bumps the mtime, so a stat() replaces a full scandir().
+# Like git's "racily clean" index entries: a listing is only cached once the directory
+# mtime is older than the coarsest filesystem timestamp granularity (2 s on FAT). A change
+# landing in the same timestamp tick as the scan would otherwise leave the mtime unchanged.
+_LISTDIR_CACHE_SIZE = 512
+_RACY_MTIME_WINDOW_NS = 2_000_000_000
+_LISTDIR_CACHE: collections.OrderedDict[tuple[str, int, int], tuple[int, int, list[str], bool]] = collections.OrderedDict()
+_LISTDIR_LOCK = threading.Lock() # Listings run on the mcp-fs pool threads
+
+def _list_directory_page(workspace_id: str, relative_path: str, offset: int, limit: int) -> dict:
+    """Validates the directory and returns one page of it (run via run_fs)."""
+    # Resolve and validate the directory path, ensuring it exists
+    absolute_path = resolve_and_validate_path_str(
+        config=config,
+        workspace_id=workspace_id,
+        relative_path=relative_path,
+        check_existence=True # Ensure the directory exists
+    )
+
+    st = os.stat(absolute_path) # Taken before the scan: a concurrent change leaves a newer mtime behind
+    if not stat.S_ISDIR(st.st_mode):
+        raise NotADirectoryError(f"Path exists but is not a directory: {absolute_path}")
+
+    key = (absolute_path, offset, limit)
+    with _LISTDIR_LOCK:
+        cached = _LISTDIR_CACHE.get(key)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_ino:
+            _LISTDIR_CACHE.move_to_end(key)
+            logger.info(f"Listed directory {absolute_path} from cache ({len(cached[2])} entries from offset {offset})")
+            return {"entries": list(cached[2]), "offset": offset, "has_more": cached[3]}
+
+    # List one page of directory contents (DirEntry names, no per-entry Path objects).
+    # The scan stops after the page plus one look-ahead entry for has_more.
+    with os.scandir(absolute_path) as it:
+        entries = [entry.name for entry in itertools.islice(it, offset, offset + limit + 1)]
+    has_more = len(entries) > limit
+    del entries[limit:]
+    if time.time_ns() - st.st_mtime_ns >= _RACY_MTIME_WINDOW_NS:
+        with _LISTDIR_LOCK:
+            _LISTDIR_CACHE[key] = (st.st_mtime_ns, st.st_ino, entries, has_more)
+            _LISTDIR_CACHE.move_to_end(key)
+            if len(_LISTDIR_CACHE) > _LISTDIR_CACHE_SIZE:
+                _LISTDIR_CACHE.popitem(last=False) # Evict the least recently listed page
+    logger.info(f"Successfully listed directory {absolute_path} ({len(entries)} entries from offset {offset})")
+    return {"entries": list(entries), "offset": offset, "has_more": has_more}
+
+@bridge_mcp_server.tool()
+async def list_directory(workspace_id: str, relative_path: str = ".", offset: int = 0, limit: int = 1000) -> dict:
     """
     Lists the contents (files and directories) of a specified directory within
-    the agent's sandboxed workspace.
+    the agent's sandboxed workspace, one page at a time.
+
+    Entries come back in filesystem order (unsorted); paging with offset/limit
+    is consistent as long as the directory is not modified in between.
 
     Args:
         workspace_id: The unique ID of the current agent workspace.
         relative_path: The path to the directory, relative to the workspace root.
                        Defaults to the workspace root itself (".").
+        offset: Number of entries to skip before the page starts.
+        limit: Maximum number of entries to return.
 
     Returns:
-        A list of filenames and directory names within the specified path.
+        A dictionary containing:
+        - entries (list[str]): Filenames and directory names in this page.
+        - offset (int): The offset this page starts at.
+        - has_more (bool): True if entries remain; request offset + len(entries) next.
 
     Raises:
-        ValueError: If workspace_id or relative_path are invalid.
+        ValueError: If workspace_id, relative_path, offset or limit are invalid.
         SandboxViolationError: If the path attempts to go outside the workspace.
         FileNotFoundError: If the directory does not exist.
         NotADirectoryError: If the path exists but is not a directory.
     """
     logger.info(f"Attempting to list directory '{relative_path}' in workspace '{workspace_id}'")
     try:
-        # Resolve and validate the directory path, ensuring it exists
-        absolute_path = resolve_and_validate_path(
-            config=config,
-            workspace_id=workspace_id,
-            relative_path=relative_path,
-            check_existence=True # Ensure the directory exists
-        )
-
-        if not absolute_path.is_dir():
-            raise NotADirectoryError(f"Path exists but is not a directory: {absolute_path}")
-
-        # List directory contents
-        contents = [item.name for item in absolute_path.iterdir()]
-        logger.info(f"Successfully listed directory {absolute_path}")
-        return contents
+        if offset < 0 or limit < 1:
+            raise ValueError(f"Invalid page: offset must be >= 0 and limit >= 1 (got offset={offset}, limit={limit}).")
+
+        return await run_fs(_list_directory_page, workspace_id, relative_path, offset, limit)
 
     except (ValueError, SandboxViolationError, FileNotFoundError, NotADirectoryError) as err:
         logger.error(f"Error listing directory: {err}")
@@ -155,8 +469,28 @@ def list_directory(workspace_id: str, relative_path: str = ".") -> list[str]:
         logger.exception(f"Unexpected error listing directory {relative_path} in {workspace_id}: {e}")
         raise
 
+def _make_directory(workspace_id: str, relative_path: str) -> str:
+    """Validates the path and creates the directory (run via run_fs)."""
+    # Resolve and validate the path *where the directory should be created*
+    # The directory itself (and any missing parents) will be created by makedirs.
+    absolute_path = resolve_and_validate_path_str(
+        config=config,
+        workspace_id=workspace_id,
+        relative_path=relative_path,
+        ensure_parent_exists=False # Let makedirs handle the final component creation
+    )
+
+    # Create the directory (and parents if necessary)
+    # exist_ok=True means it won't raise an error if the directory already exists
+    os.makedirs(absolute_path, exist_ok=True)
+
+    # Final check to ensure it's actually a directory now
+    if not os.path.isdir(absolute_path):
+         raise IOError(f"Failed to create directory or path is not a directory: {absolute_path}")
+    return absolute_path
+
 @bridge_mcp_server.tool()
-def create_directory(workspace_id: str, relative_path: str) -> bool:
+async def create_directory(workspace_id: str, relative_path: str) -> bool:
     """
     Creates a directory (including any necessary parent directories) within
     the agent's sandboxed workspace.
@@ -175,24 +509,7 @@ def create_directory(workspace_id: str, relative_path: str) -> bool:
     """
     logger.info(f"Attempting to create directory '{relative_path}' in workspace '{workspace_id}'")
     try:
-        # Resolve and validate the path *where the directory should be created*
-        # We use ensure_parent_exists=True to create the parent structure safely.
-        # The final component (the directory itself) will be created by mkdir.
-        absolute_path = resolve_and_validate_path(
-            config=config,
-            workspace_id=workspace_id,
-            relative_path=relative_path,
-            ensure_parent_exists=False # Let mkdir handle the final component creation
-        )
-
-        # Create the directory (and parents if necessary)
-        # exist_ok=True means it won't raise an error if the directory already exists
-        absolute_path.mkdir(parents=True, exist_ok=True)
-
-        # Final check to ensure it's actually a directory now
-        if not absolute_path.is_dir():
-             raise IOError(f"Failed to create directory or path is not a directory: {absolute_path}")
-
+        absolute_path = await run_fs(_make_directory, workspace_id, relative_path)
         logger.info(f"Successfully ensured directory exists: {absolute_path}")
         return True
 
@@ -1,102 +1,305 @@
 # mcp_server/tools/git.py
+import asyncio
 import logging
-import subprocess
+import os
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
-# Assuming access to bridge_mcp_server and config from main.py
-from mcp_server.main import bridge_mcp_server, config
-from mcp_server.core.security import resolve_and_validate_path, SandboxViolationError
+import anyio
+try:
+    import pygit2 # libgit2 bindings: local git operations run in-process, without fork/exec
+except ImportError:
+    pygit2 = None # Falls back to the git CLI for every operation
+
+# Shared FastMCP instance and settings (see runtime.py)
+from mcp_server.runtime import bridge_mcp_server, SETTINGS as config
+from mcp_server.core.security import resolve_and_validate_path_str, SandboxViolationError
+from mcp_server.core.snapshots import create_snapshot, AUTO_SNAPSHOT_ID
 
 logger = logging.getLogger(__name__)
 
-def _run_git_command(workspace_id: str, relative_dir: str, command_args: list[str]) -> dict[str, Any]:
-    """Helper function to run git commands securely within the workspace."""
-    logger.info(f"Running git command: {' '.join(command_args)} in workspace '{workspace_id}/{relative_dir}'")
-    try:
-        # Resolve and validate the working directory path
-        working_dir_path = resolve_and_validate_path(
-            config=config,
-            workspace_id=workspace_id,
-            relative_path=relative_dir,
-            check_existence=True # Ensure the directory exists
-        )
-        if not working_dir_path.is_dir():
-            raise NotADirectoryError(f"Git working directory is not valid: {working_dir_path}")
+# Network git commands slower than this leave an automatic workspace snapshot behind:
+# restoring it (restore_workspace) is then cheaper than repeating the command
+AUTO_SNAPSHOT_MIN_SECONDS = 10.0
+
+def _validate_working_dir(workspace_id: str, relative_dir: str) -> str:
+    """Resolves and validates a git working directory inside the workspace."""
+    working_dir_path = resolve_and_validate_path_str(
+        config=config,
+        workspace_id=workspace_id,
+        relative_path=relative_dir,
+        check_existence=True # Ensure the directory exists
+    )
+    if not os.path.isdir(working_dir_path):
+        raise NotADirectoryError(f"Git working directory is not valid: {working_dir_path}")
+    return working_dir_path
+
+async def _exec_git(cwd: str, command_args: list[str]) -> dict[str, Any]:
+    """
+    Runs one git command in an already validated working directory.
 
+    The git process runs without blocking the event loop, so concurrent tool
+    calls (e.g. git_pull across several workspaces) overlap.
+    """
+    logger.info(f"Running git command: {' '.join(command_args)} in '{cwd}'")
+    try:
         # Construct the full command
         full_command = ["git"] + command_args
 
         # Execute the command
-        # Capture output, use text mode, set cwd, check for errors
-        result = subprocess.run(
-            full_command,
-            cwd=working_dir_path,
-            capture_output=True,
-            text=True,
-            check=False # We check the returncode manually for better error reporting
+        # Capture output, set cwd; the returncode is checked manually for better error reporting
+        proc = await asyncio.create_subprocess_exec(
+            *full_command,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
         )
+        # communicate() drains both pipes concurrently (no 64 KiB pipe-buffer deadlock on big
+        # diffs); the output is then decoded once, and non-UTF-8 file content can't fail the call
+        stdout_bytes, stderr_bytes = await proc.communicate()
+        stdout = stdout_bytes.decode('utf-8', errors='replace')
+        stderr = stderr_bytes.decode('utf-8', errors='replace')
 
-        logger.info(f"Git command finished with code: {result.returncode}")
-        if result.returncode != 0:
-             logger.error(f"Git command error: {result.stderr}")
+        logger.info(f"Git command finished with code: {proc.returncode}")
+        if proc.returncode != 0:
+             logger.error(f"Git command error: {stderr}")
         #else:
-             #logger.debug(f"Git command stdout: {result.stdout}") # Optional: log success stdout
+             #logger.debug(f"Git command stdout: {stdout}") # Optional: log success stdout
 
         return {
             "command": " ".join(full_command),
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "returncode": result.returncode,
-            "success": result.returncode == 0
+            "stdout": stdout.strip(),
+            "stderr": stderr.strip(),
+            "returncode": proc.returncode,
+            "success": proc.returncode == 0
         }
 
+    except Exception as e:
+        logger.exception(f"Unexpected error running git command {' '.join(command_args)}: {e}")
+        return {"success": False, "stderr": str(e), "returncode": -1}
+
+async def _run_git_command(workspace_id: str, relative_dir: str, *commands: list[str]) -> dict[str, Any]:
+    """
+    Helper function to run git commands securely within the workspace.
+
+    The working directory is validated once, then each command runs in turn;
+    the first failing command's result (or else the last one's) is returned.
+    """
+    try:
+        working_dir_path = _validate_working_dir(workspace_id, relative_dir)
     except (ValueError, SandboxViolationError, FileNotFoundError, NotADirectoryError) as err:
         logger.error(f"Error preparing git command: {err}")
         return {"success": False, "stderr": str(err), "returncode": -1}
+
+    for command_args in commands:
+        result = await _exec_git(working_dir_path, command_args)
+        if not result["success"]:
+            break
+    return result
+
+
+async def _run_git_command_with_snapshot(workspace_id: str, relative_dir: str, command_args: list[str]) -> dict[str, Any]:
+    """Runs a git command and snapshots the workspace (as AUTO_SNAPSHOT_ID) if it succeeded slowly."""
+    started = time.perf_counter()
+    result = await _run_git_command(workspace_id, relative_dir, command_args)
+    elapsed = time.perf_counter() - started
+    if result["success"] and elapsed >= AUTO_SNAPSHOT_MIN_SECONDS:
+        try:
+            await anyio.to_thread.run_sync(create_snapshot, config, workspace_id, AUTO_SNAPSHOT_ID)
+            result["snapshot_id"] = AUTO_SNAPSHOT_ID
+            logger.info(f"git {command_args[0]} took {elapsed:.1f}s; snapshotted workspace '{workspace_id}' as {AUTO_SNAPSHOT_ID}")
+        except Exception as e:
+            logger.warning(f"Automatic snapshot of workspace '{workspace_id}' failed: {e}")
+    return result
+
+
+# Opened repositories keyed by validated working directory; libgit2's repo open
+# (discovery, config and odb setup) is itself non-trivial, so do it once.
+# Only repositories whose workdir is exactly that directory are cached: one discovered
+# further up (from a subdirectory) may be replaced by a later clone/init in between.
+_REPOSITORIES: dict[str, "pygit2.Repository"] = {}
+
+def forget_repositories(workspace_path: str | Path) -> None:
+    """Drops cached Repositories under workspace_path, e.g. after the workspace was restored."""
+    root = str(workspace_path)
+    for path in [path for path in _REPOSITORIES if path == root or path.startswith(root + os.sep)]:
+        del _REPOSITORIES[path]
+
+# One lock per repository (keyed by its .git directory): pygit2 Repository objects and the
+# index file must not be used by two worker threads at once
+_REPOSITORY_LOCKS: dict[str, asyncio.Lock] = {}
+
+def _discover_repository(working_dir_path: str) -> "pygit2.Repository":
+    # Discovery never leaves the sandbox: the sandbox root is a ceiling directory,
+    # so a repository enclosing the sandbox can't be picked up (and committed to)
+    git_dir = pygit2.discover_repository(working_dir_path, False, os.path.realpath(config.DIRECTORY_SANDBOX))
+    if git_dir is None:
+        raise pygit2.GitError("not a git repository (or any of the parent directories): .git")
+    return pygit2.Repository(git_dir)
+
+async def _open_repository(workspace_id: str, relative_dir: str) -> "pygit2.Repository":
+    """Validates the working directory and returns its (cached) pygit2 Repository."""
+    working_dir_path = _validate_working_dir(workspace_id, relative_dir)
+    repo = _REPOSITORIES.get(working_dir_path)
+    if repo is None:
+        repo = await anyio.to_thread.run_sync(_discover_repository, working_dir_path)
+        if repo.workdir is not None and os.path.normpath(repo.workdir) == working_dir_path:
+            _REPOSITORIES[working_dir_path] = repo
+    return repo
+
+async def _run_repo_operation(workspace_id: str, relative_dir: str, description: str,
+                              operation: Callable[["pygit2.Repository"], str]) -> dict[str, Any]:
+    """
+    Runs a local git operation through pygit2; returns the same shape as _run_git_command.
+
+    The operation (status scans, index writes, diffs) runs in a worker thread, so a
+    large worktree doesn't stall the event loop and other tool calls.
+    """
+    logger.info(f"Running in-process git operation: {description} in workspace '{workspace_id}/{relative_dir}'")
+    try:
+        repo = await _open_repository(workspace_id, relative_dir)
+    except (ValueError, SandboxViolationError, FileNotFoundError, NotADirectoryError) as err:
+        logger.error(f"Error preparing git command: {err}")
+        return {"success": False, "stderr": str(err), "returncode": -1}
+    except pygit2.GitError as err: # Not a git repository
+        logger.error(f"Git command error: {err}")
+        return {"command": f"git {description}", "stdout": "", "stderr": str(err), "returncode": 128, "success": False}
+
+    try:
+        async with _REPOSITORY_LOCKS.setdefault(repo.path, asyncio.Lock()):
+            stdout = await anyio.to_thread.run_sync(operation, repo)
+    except (pygit2.GitError, KeyError, ValueError) as err:
+        logger.error(f"Git command error: {err}")
+        return {"command": f"git {description}", "stdout": "", "stderr": str(err), "returncode": 1, "success": False}
     except Exception as e:
-        logger.exception(f"Unexpected error running git command {' '.join(command_args)}: {e}")
+        logger.exception(f"Unexpected error running git operation {description}: {e}")
         return {"success": False, "stderr": str(e), "returncode": -1}
 
+    logger.info(f"Git operation finished: {description}")
+    return {"command": f"git {description}", "stdout": stdout.strip(), "stderr": "", "returncode": 0, "success": True}
+
+def _commit(repo: "pygit2.Repository", message: str, add_all: bool, include_untracked: bool) -> str:
+    index = repo.index
+    index.read() # Pick up changes made by git CLI operations (pull, clone, ...)
+    if add_all and include_untracked:
+        index.add_all() # Same as 'git add .'
+        index.write()
+    elif add_all:
+        # Same as 'git commit -a': stage modified/deleted tracked files only
+        for path, flags in repo.status().items():
+            if flags & pygit2.GIT_STATUS_WT_DELETED:
+                index.remove(path)
+            elif flags & (pygit2.GIT_STATUS_WT_MODIFIED | pygit2.GIT_STATUS_WT_TYPECHANGE):
+                index.add(path)
+        index.write()
+
+    tree = index.write_tree()
+    parents = [] if repo.head_is_unborn else [repo.head.target]
+    if parents:
+        nothing_to_commit = tree == repo.head.peel(pygit2.Commit).tree_id
+    else:
+        nothing_to_commit = len(index) == 0
+    if nothing_to_commit:
+        raise pygit2.GitError("nothing to commit, working tree clean")
+    signature = repo.default_signature # user.name / user.email from git config
+    commit_id = repo.create_commit("HEAD", signature, signature, message, tree, parents)
+    branch = "detached HEAD" if repo.head_is_detached else repo.head.shorthand
+    summary = message.partition("\n")[0]
+    return f"[{branch} {str(commit_id)[:7]}] {summary}"
+
+def _diff_staged(repo: "pygit2.Repository") -> str:
+    index = repo.index
+    index.read()
+    if repo.head_is_unborn:
+        head_tree = repo[repo.TreeBuilder().write()] # Empty tree: everything staged is new
+    else:
+        head_tree = repo.head.peel(pygit2.Tree)
+    return index.diff_to_tree(head_tree).patch or ""
+
+def _create_branch(repo: "pygit2.Repository", branch_name: str) -> str:
+    repo.branches.local.create(branch_name, repo.head.peel(pygit2.Commit))
+    return ""
+
+def _checkout_branch(repo: "pygit2.Repository", branch_name: str) -> str:
+    branch = repo.branches.local.get(branch_name)
+    if branch is not None:
+        repo.checkout(branch) # Safe strategy: refuses to clobber local changes
+        return f"Switched to branch '{branch_name}'"
+
+    # Like 'git checkout <name>': create a local branch tracking origin/<name> if that exists
+    remote_branch = repo.branches.remote.get(f"origin/{branch_name}")
+    if remote_branch is None:
+        raise pygit2.GitError(f"pathspec '{branch_name}' did not match any file(s) known to git")
+    branch = repo.branches.local.create(branch_name, remote_branch.peel(pygit2.Commit))
+    try:
+        branch.upstream = remote_branch
+        repo.checkout(branch)
+    except Exception:
+        branch.delete() # Leave no half-created branch behind, as git does
+        raise
+    return (f"branch '{branch_name}' set up to track 'origin/{branch_name}'.\n"
+            f"Switched to a new branch '{branch_name}'")
+
 
 @bridge_mcp_server.tool()
-def git_clone(workspace_id: str, repo_url: str, directory: str = ".") -> dict[str, Any]:
+async def git_clone(workspace_id: str, repo_url: str, directory: str = ".") -> dict[str, Any]:
     """Clones a git repository into a specified directory within the workspace."""
     # Note: Cloning target directory is relative *within* the specified 'directory' arg
     # which itself is relative to the workspace. Usually directory="."
-    return _run_git_command(workspace_id, directory, ["clone", repo_url, "."]) # Clone into the validated dir
+    # Network operations (clone/push/pull) stay on the git CLI for its transport/credential support
+    result = await _run_git_command_with_snapshot(workspace_id, directory, ["clone", repo_url, "."]) # Clone into the validated dir
+    if result["success"]:
+        forget_repositories(_validate_working_dir(workspace_id, directory)) # A new repository now lives there
+    return result
 
 @bridge_mcp_server.tool()
-def git_commit(workspace_id: str, message: str, add_all: bool = True, directory: str = ".") -> dict[str, Any]:
-    """Creates a git commit with the given message. Optionally stages all changes first."""
-    if add_all:
-        add_result = _run_git_command(workspace_id, directory, ["add", "."])
-        if not add_result["success"]:
-            logger.error(f"git add failed: {add_result['stderr']}")
-            return add_result # Return the error from git add
-    return _run_git_command(workspace_id, directory, ["commit", "-m", message])
+async def git_commit(workspace_id: str, message: str, add_all: bool = True, directory: str = ".", include_untracked: bool = False) -> dict[str, Any]:
+    """
+    Creates a git commit with the given message. Optionally stages all changes first.
+
+    add_all stages modified/deleted tracked files via 'git commit -a' (one git process).
+    New files are only picked up with include_untracked=True, which runs 'git add .' first.
+    With pygit2 installed the commit is made in-process; note that git hooks are not run then.
+    """
+    if pygit2 is not None:
+        return await _run_repo_operation(workspace_id, directory, "commit",
+                                         lambda repo: _commit(repo, message, add_all, include_untracked))
+    commit_args = ["commit", "-a", "-m", message] if add_all else ["commit", "-m", message]
+    if add_all and include_untracked:
+        # Validates the directory once; a failed 'git add' is returned without committing
+        return await _run_git_command(workspace_id, directory, ["add", "."], commit_args)
+    return await _run_git_command(workspace_id, directory, commit_args)
 
 @bridge_mcp_server.tool()
-def git_diff_staged(workspace_id: str, directory: str = ".") -> dict[str, Any]:
+async def git_diff_staged(workspace_id: str, directory: str = ".") -> dict[str, Any]:
     """Shows changes staged for the next commit."""
-    return _run_git_command(workspace_id, directory, ["diff", "--staged"])
+    if pygit2 is not None:
+        return await _run_repo_operation(workspace_id, directory, "diff --staged", _diff_staged)
+    return await _run_git_command(workspace_id, directory, ["diff", "--staged"])
 
 @bridge_mcp_server.tool()
-def git_push(workspace_id: str, directory: str = ".", remote: str = "origin", branch: str = "main") -> dict[str, Any]:
+async def git_push(workspace_id: str, directory: str = ".", remote: str = "origin", branch: str = "main") -> dict[str, Any]:
     """Pushes commits to the specified remote and branch."""
-    return _run_git_command(workspace_id, directory, ["push", remote, branch])
+    return await _run_git_command(workspace_id, directory, ["push", remote, branch])
 
 @bridge_mcp_server.tool()
-def git_pull(workspace_id: str, directory: str = ".", remote: str = "origin", branch: str = "main") -> dict[str, Any]:
+async def git_pull(workspace_id: str, directory: str = ".", remote: str = "origin", branch: str = "main") -> dict[str, Any]:
     """Pulls changes from the specified remote and branch."""
-    return _run_git_command(workspace_id, directory, ["pull", remote, branch])
+    return await _run_git_command_with_snapshot(workspace_id, directory, ["pull", remote, branch])
 
 @bridge_mcp_server.tool()
-def git_create_branch(workspace_id: str, branch_name: str, directory: str = ".") -> dict[str, Any]:
+async def git_create_branch(workspace_id: str, branch_name: str, directory: str = ".") -> dict[str, Any]:
     """Creates a new git branch."""
-    return _run_git_command(workspace_id, directory, ["branch", branch_name])
+    if pygit2 is not None:
+        return await _run_repo_operation(workspace_id, directory, f"branch {branch_name}",
+                                         lambda repo: _create_branch(repo, branch_name))
+    return await _run_git_command(workspace_id, directory, ["branch", branch_name])
 
 @bridge_mcp_server.tool()
-def git_checkout_branch(workspace_id: str, branch_name: str, directory: str = ".") -> dict[str, Any]:
+async def git_checkout_branch(workspace_id: str, branch_name: str, directory: str = ".") -> dict[str, Any]:
     """Checks out an existing git branch."""
-    return _run_git_command(workspace_id, directory, ["checkout", branch_name])
+    if pygit2 is not None:
+        return await _run_repo_operation(workspace_id, directory, f"checkout {branch_name}",
+                                         lambda repo: _checkout_branch(repo, branch_name))
+    return await _run_git_command(workspace_id, directory, ["checkout", branch_name])
@@ -1,17 +1,23 @@
 # starship-bridge-mcp-agent/mcp_server/tools/workspace.py
 import logging
+import os
 import uuid
-from pathlib import Path
 import shutil # For potential future cleanup tool (delete_workspace)
 import re # For sanitizing project name
 
-# Assuming access to bridge_mcp_server and config from main.py
-# Adjust import if your structure differs or uses dependency injection later
-from mcp_server.main import bridge_mcp_server, config
-from mcp_server.core.security import resolve_and_validate_path, SandboxViolationError
+import anyio
+
+# Shared FastMCP instance and settings (see runtime.py)
+from mcp_server.runtime import bridge_mcp_server, SETTINGS as config
+from mcp_server.core.security import resolve_and_validate_path_str, register_workspace_root, SandboxViolationError
+from mcp_server.core.snapshots import create_snapshot, restore_snapshot, new_snapshot_id
+from mcp_server.tools.git import forget_repositories
 
 logger = logging.getLogger(__name__)
 
+# Runs of characters that are not safe in a workspace directory name
+_SAFE_NAME_RE = re.compile(r'[^\w-]+')
+
 @bridge_mcp_server.tool()
 def create_workspace(project_name: str) -> dict:
     """
@@ -39,18 +45,17 @@ def create_workspace(project_name: str) -> dict:
 
         # Sanitize project name for use in directory path (limit length, alphanumeric/underscore)
         # Remove leading/trailing whitespace and replace non-alphanumeric with underscore
-        safe_name = re.sub(r'[^\w-]+', '_', project_name.strip())
-        safe_name = safe_name[:50] # Limit length
+        safe_name = _SAFE_NAME_RE.sub('_', project_name.strip())[:50] # Limit length
 
         # Generate a unique workspace ID
         workspace_id = f"ws_{safe_name}_{uuid.uuid4().hex[:8]}"
         logger.info(f"Attempting to create workspace with generated ID: {workspace_id} for project '{project_name}'")
 
-        # Use resolve_and_validate_path to get the intended absolute path AND validate it's
+        # Use resolve_and_validate_path_str to get the intended absolute path AND validate it's
         # within the main sandbox root *before* attempting creation.
         # We pass workspace_id as the 'workspace_id' argument and '.' as the relative path
         # to validate the root of the workspace itself.
-        workspace_path = resolve_and_validate_path(
+        workspace_path = resolve_and_validate_path_str(
             config=config,
             workspace_id=workspace_id, # Use the generated ID here
             relative_path=".", # Target is the root of the new workspace directory
@@ -58,16 +63,16 @@ def create_workspace(project_name: str) -> dict:
             check_existence=False # It should *not* exist yet
         )
 
-        # Create the directory using pathlib
-        # parents=True: Creates parent directories if needed (though sandbox root should exist)
+        # Create the directory (also creates parent directories, though the sandbox root should exist)
         # exist_ok=False: Crucially, raises FileExistsError if the directory already exists
-        workspace_path.mkdir(parents=True, exist_ok=False)
+        os.makedirs(workspace_path, exist_ok=False)
+        register_workspace_root(workspace_id, workspace_path) # Later tool calls skip the join
 
         logger.info(f"Successfully created workspace: {workspace_path}")
         return {
             "success": True,
             "workspace_id": workspace_id,
-            "absolute_path": str(workspace_path),
+            "absolute_path": workspace_path,
             "error": None
         }
 
@@ -93,6 +98,67 @@ def create_workspace(project_name: str) -> dict:
         logger.exception(err_msg) # Log full traceback for unexpected errors
         return {"success": False, "workspace_id": workspace_id, "absolute_path": None, "error": err_msg}
 
+@bridge_mcp_server.tool()
+async def snapshot_workspace(workspace_id: str) -> dict:
+    """
+    Saves a copy of the workspace's current state, so it can later be rolled back
+    with restore_workspace instead of being rebuilt (e.g. re-cloned) from scratch.
+
+    Args:
+        workspace_id: The unique ID of the workspace to snapshot.
+
+    Returns:
+        A dictionary containing:
+        - success (bool): True if the snapshot was created.
+        - snapshot_id (str | None): The ID to pass to restore_workspace, or None on failure.
+        - error (str | None): An error message if the snapshot failed, otherwise None.
+    """
+    snapshot_id = new_snapshot_id()
+    logger.info(f"Attempting to snapshot workspace '{workspace_id}' as {snapshot_id}")
+    try:
+        snapshot_path = await anyio.to_thread.run_sync(create_snapshot, config, workspace_id, snapshot_id)
+        logger.info(f"Successfully snapshotted workspace '{workspace_id}' to {snapshot_path}")
+        return {"success": True, "snapshot_id": snapshot_id, "error": None}
+
+    except (ValueError, SandboxViolationError, FileNotFoundError, NotADirectoryError) as err:
+        err_msg = f"Error snapshotting workspace '{workspace_id}': {err}"
+        logger.error(err_msg)
+        return {"success": False, "snapshot_id": None, "error": err_msg}
+    except Exception as e:
+        err_msg = f"Unexpected error snapshotting workspace '{workspace_id}': {e}"
+        logger.exception(err_msg)
+        return {"success": False, "snapshot_id": None, "error": err_msg}
+
+@bridge_mcp_server.tool()
+async def restore_workspace(workspace_id: str, snapshot_id: str) -> dict:
+    """
+    Rolls a workspace back to a snapshot taken by snapshot_workspace (or the automatic
+    'snap_auto' snapshot taken after a slow git_clone/git_pull). All changes made since
+    the snapshot are discarded. The snapshot is kept and can be restored again.
+
+    Args:
+        workspace_id: The unique ID of the workspace to roll back.
+        snapshot_id: The ID of the snapshot to restore.
+
+    Returns:
+        A dictionary with success status and error message.
+    """
+    logger.warning(f"Attempting to restore workspace '{workspace_id}' from snapshot {snapshot_id}")
+    try:
+        workspace_path = await anyio.to_thread.run_sync(restore_snapshot, config, workspace_id, snapshot_id)
+        forget_repositories(workspace_path) # Cached pygit2 handles point at the replaced tree
+        logger.info(f"Successfully restored workspace '{workspace_id}' from snapshot {snapshot_id}")
+        return {"success": True, "error": None}
+
+    except (ValueError, SandboxViolationError, FileNotFoundError, NotADirectoryError) as err:
+        err_msg = f"Error restoring workspace '{workspace_id}': {err}"
+        logger.error(err_msg)
+        return {"success": False, "error": err_msg}
+    except Exception as e:
+        err_msg = f"Unexpected error restoring workspace '{workspace_id}': {e}"
+        logger.exception(err_msg)
+        return {"success": False, "error": err_msg}
+
 # --- Planned Future Tools ---
 # @bridge_mcp_server.tool()
 # def delete_workspace(workspace_id: str) -> dict:
@@ -118,6 +184,7 @@ def create_workspace(project_name: str) -> dict:
 
 #         # Use shutil.rmtree for recursive deletion
 #         shutil.rmtree(workspace_path)
+#         forget_workspace_root(workspace_id)
 #         logger.info(f"Successfully deleted workspace: {workspace_path}")
 #         return {"success": True, "error": None}
 